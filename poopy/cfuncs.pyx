@@ -11,11 +11,18 @@ cimport numpy as np
 cimport cython
 from libc.stdlib cimport malloc, free
 
+# Types that flow can be accumulated in: counts (e.g., of upstream sources) can use 32 bit integers, 
+# which halves the memory traffic of the accumulation compared to doubles.
+ctypedef fused accum_t:
+    int
+    double
+
 @cython.boundscheck(False)  # Deactivate bounds checking
 @cython.wraparound(False)   # Deactivate negative indexing.
-def d8_to_receivers(np.ndarray[long, ndim=2] arr) -> long[:] :
+def d8_to_receivers(np.ndarray[long, ndim=2] arr) -> int[:] :
     """
-    Converts a D8 flow direction array to a receiver array.
+    Converts a D8 flow direction array to a receiver array. Node indices are stored as 32 bit integers
+    (as in the ordered list of nodes), which halves the memory traffic of traversing the network.
 
     Args:
         arr: A D8 flow direction array.
@@ -25,7 +32,7 @@ def d8_to_receivers(np.ndarray[long, ndim=2] arr) -> long[:] :
     """
     cdef int nrows = arr.shape[0]
     cdef int ncols = arr.shape[1]
-    cdef long[:] receivers = np.empty(nrows * ncols, dtype=long)
+    cdef int[:] receivers = np.empty(nrows * ncols, dtype=np.int32)
     cdef int i, j
     cdef int cell
     for i in range(nrows):
@@ -57,7 +64,7 @@ def d8_to_receivers(np.ndarray[long, ndim=2] arr) -> long[:] :
 
 @cython.boundscheck(False)  # Deactivate bounds checking
 @cython.wraparound(False)   # Deactivate negative indexing.
-def count_donors(long[:] r) -> int[:] :
+def count_donors(const int[:] r) -> int[:] :
     """
     Counts the number of donors that each cell has.
 
@@ -101,7 +108,7 @@ def ndonors_to_delta(int[:] nd) -> int[:] :
 
 @cython.boundscheck(False)  # Deactivate bounds checking
 @cython.wraparound(False)   # Deactivate negative indexing.
-def make_donor_array(long[:] r, int[:] delta) -> int[:] :
+def make_donor_array(const int[:] r, int[:] delta) -> int[:] :
     """
     Makes the array of donors. This is indexed according to the delta
     array. i.e., the donors to node i are stored in the range delta[i] to delta[i+1].
@@ -157,7 +164,7 @@ def add_to_ordered_list(int l, int j, int[:] s, int[:] delta, int[:] donors) ->
 
 @cython.boundscheck(False)  # Deactivate bounds checking
 @cython.wraparound(False)   # Deactivate negative indexing.
-def build_ordered_list_recursive(long[:] receivers, np.ndarray[long, ndim=1] baselevel_nodes) -> int[:] :
+def build_ordered_list_recursive(const int[:] receivers, np.ndarray[long, ndim=1] baselevel_nodes) -> int[:] :
     """
     Builds the ordered list of nodes in topological order, given the receiver array.
     Starts at the baselevel nodes and works upstream. This uses recursion 
@@ -185,7 +192,7 @@ def build_ordered_list_recursive(long[:] receivers, np.ndarray[long, ndim=1] bas
 
 @cython.boundscheck(False)  # Deactivate bounds checking
 @cython.wraparound(False)   # Deactivate negative indexing.
-def build_ordered_list_iterative(long[:] receivers, np.ndarray[long, ndim=1] baselevel_nodes) -> int[:] :
+def build_ordered_list_iterative(const int[:] receivers, np.ndarray[long, ndim=1] baselevel_nodes) -> int[:] :
     """
     Builds the ordered list of nodes in topological order, given the receiver array.
     Starts at the baselevel nodes and works upstream in a wave building a 
@@ -235,8 +242,8 @@ def build_ordered_list_iterative(long[:] receivers, np.ndarray[long, ndim=1] bas
 @cython.boundscheck(False)  # Deactivate bounds checking
 @cython.wraparound(False)   # Deactivate negative indexing.
 def accumulate_flow(
-    long[:] receivers, 
-    int[:] ordered, 
+    const int[:] receivers, 
+    const int[:] ordered, 
     np.ndarray[double, ndim=1] weights
 ):
     """
@@ -249,19 +256,41 @@ def accumulate_flow(
         ordered: The ordered list of nodes.
         weights: The weights array (i.e., the contribution from each node).
     """
-    cdef int n = receivers.shape[0]
     cdef np.ndarray[double, ndim=1] accum = weights.copy()
-    cdef int i
-    cdef long donor, recvr
+    accumulate_flow_inplace(receivers, ordered, accum)
+    return accum
 
-    # Accumulate flow along the stack from upstream to downstream
-    for i in range(n - 1, -1, -1):
-        donor = ordered[i]
-        recvr = receivers[donor]
-        if donor != recvr:
-            accum[recvr] += accum[donor]
+@cython.boundscheck(False)  # Deactivate bounds checking
+@cython.wraparound(False)   # Deactivate negative indexing.
+def accumulate_flow_inplace(
+    const int[:] receivers, 
+    const int[:] ordered, 
+    accum_t[:] accum
+):
+    """
+    Accumulates flow along the stack of nodes in topological order, as in accumulate_flow, but 
+    modifies the weights array in place rather than copying it. The weights array can be of
+    doubles or of 32 bit integers (e.g., for counts).
 
-    return accum
+    Args:
+        receivers: The receiver array (i.e., receiver[i] is the ID
+        of the node that receives the flow from the i'th node).
+        ordered: The ordered list of nodes.
+        accum: The weights array (i.e., the contribution from each node), which is overwritten 
+        with the accumulated flow.
+    """
+    cdef int n = receivers.shape[0]
+    cdef int i
+    cdef int donor, recvr
+
+    # Accumulate flow along the stack from upstream to downstream. The loop only touches the memoryviews, so
+    # the GIL is released and accumulations (e.g., for different water companies) can run in parallel threads.
+    with nogil:
+        for i in range(n - 1, -1, -1):
+            donor = ordered[i]
+            recvr = receivers[donor]
+            if donor != recvr:
+                accum[recvr] += accum[donor]
 
 @cython.boundscheck(False)  # Deactivate bounds checking
 @cython.wraparound(False)   # Deactivate negative indexing.
@@ -269,7 +298,7 @@ def get_channel_segments(
     long[:] starting_nodes,
     int[:] delta,
     int[:] donors,
-    double[:] field,
+    const double[:] field,
     float threshold= 0
 ):
     """
@@ -441,7 +470,7 @@ def id_segments_to_coords_segments(vector[vector[int]] segments, int ncols, floa
 
 @cython.boundscheck(False)  # Deactivate bounds checking
 @cython.wraparound(False)   # Deactivate negative indexing.    
-def get_profile(long start_node, float dx, float dy, long[:] receivers, long[:] d8):
+def get_profile(long start_node, float dx, float dy, const int[:] receivers, const long[:] d8):
     """
     Gets the profile of a channel segment, given the start node, the receiver array, and the D8 flow direction array. 
 
@@ -10,15 +10,21 @@ for more flexibility in the future if the APIs change and require different meth
 """
 
 from datetime import datetime, timedelta
-from multiprocessing import Pool
-from typing import Callable, Dict, List, Tuple
+from typing import List
 import warnings
 
 import pandas as pd
-import requests
 from osgeo import osr
 
-from poopy.poopy import Discharge, Event, Monitor, NoDischarge, Offline, WaterCompany
+from poopy.poopy import (
+    Discharge,
+    Event,
+    Monitor,
+    NoDischarge,
+    Offline,
+    WaterCompany,
+    _http_session,
+)
 
 
 class ThamesWater(WaterCompany):
@@ -58,7 +64,7 @@ class ThamesWater(WaterCompany):
     def set_all_histories(self) -> None:
         """
         Sets the historical data for all active monitors and store it in the history attribute of each monitor.
-        A faster version of this function is available in the `set_all_histories_parallel` method.
+        The alerts of all monitors are fetched together, then split by monitor in a single pass.
         """
         self._history_timestamp = datetime.now()
         df = self._fetch_all_monitors_history_df()
@@ -72,42 +78,23 @@ class ThamesWater(WaterCompany):
                 f"\033[31m\n! WARNING ! The following historical monitors are no longer active: {inactive_names}\nStoring historical data for inactive monitors is not currently supported!\nIf this message has appeared it should be implemented...\033[0m "
             )
         print("\033[36m" + f"Building history for monitors..." + "\033[0m")
+        # Grouping splits the alerts in one pass, rather than filtering the whole dataframe once per monitor
+        subsets = dict(tuple(df.groupby("LocationName", sort=False)))
+        no_alerts = df.iloc[:0]
         for name in active_names:
-            subset = df[df["LocationName"] == name]
+            subset = subsets.get(name, no_alerts)
             monitor = self.active_monitors[name]
-            monitor._history = self._alerts_df_to_events_list(subset, monitor)
+            monitor.history = self._alerts_df_to_events_list(subset, monitor)
 
     def set_all_histories_parallel(self) -> None:
         """
-        Sets the historical data for all active monitors and store it in the history attribute of each monitor.
-        Faster than the `set_all_histories` method if multiple cores are available.
+        Deprecated: use `set_all_histories`, which is now as fast without starting a pool of processes.
         """
-        self._history_timestamp = datetime.datetime.now()
-        df = self._fetch_all_monitors_history_df()
-        historical_names = df["LocationName"].unique().tolist()
-        # Find which monitors present in historical_names are not in active_names
-        active_names = self.active_monitor_names
-        inactive_names = [x for x in historical_names if x not in active_names]
-        # If inactive is not empty raise a warning using the warnings module in red using ANSI escape codes
-        if inactive_names:
-            warnings.warn(
-                f"\033[31m\n! WARNING ! The following historical monitors are no longer active: {inactive_names}\nStoring historical data for inactive monitors is not currently supported!\nIf this message has appeared it should be implemented...\033[0m "
-            )
-        print("\033[36m" + f"Building history for monitors..." + "\033[0m")
-
-        # Prepare arguments for parallel processing
-        args_list = [
-            (name, df, self.active_monitors, self._alerts_df_to_events_list)
-            for name in active_names
-        ]
-
-        # Use a Pool to parallelize the loop (this is faster)
-        with Pool() as pool:
-            results = pool.map(_process_monitor_history_pl, args_list)
-
-        # Update the monitor objects with the results in serial
-        for name, history in results:
-            self.active_monitors[name]._history = history
+        warnings.warn(
+            "`set_all_histories_parallel` is deprecated. Use `set_all_histories` instead.",
+            DeprecationWarning,
+        )
+        self.set_all_histories()
 
     def _fetch_current_status_df(self) -> pd.DataFrame:
         """
@@ -181,9 +168,11 @@ class ThamesWater(WaterCompany):
         Loops through the API calls until all the records are fetched. If verbose is set to True, the function will print the full dataframe
         to the console.
         """
-        df = pd.DataFrame()
+        # Items from every page are collected and normalised into a dataframe once, rather than concatenating a
+        # dataframe for each page
+        items = []
         while True:
-            r = requests.get(
+            r = _http_session().get(
                 url,
                 headers={
                     "client_id": self.clientID,
@@ -201,16 +190,15 @@ class ThamesWater(WaterCompany):
                     print("\033[36m" + "\tNo more records to fetch" + "\033[0m")
                     break
                 else:
-                    df_temp = pd.json_normalize(response["items"])
+                    items.extend(response["items"])
             else:
                 raise Exception(
                     "\tRequest failed with status code {0}, and error message: {1}".format(
                         r.status_code, r.json()
                     )
                 )
-            df = pd.concat([df, df_temp])
             params["offset"] += params["limit"]  # Increment offset for the next request
-        df.reset_index(drop=True, inplace=True)
+        df = pd.json_normalize(items)
 
         # Print the full dataframe to the console if verbose is set to True
         if verbose:
@@ -245,7 +233,7 @@ class ThamesWater(WaterCompany):
         )
         df = pd.DataFrame()
         while True:
-            r = requests.get(
+            r = _http_session().get(
                 url,
                 headers={
                     "client_id": self.clientID,
@@ -459,7 +447,7 @@ class WelshWater(WaterCompany):
         """
         df = pd.DataFrame()
 
-        r = requests.get(
+        r = _http_session().get(
             url,
             params=params,
         )
@@ -472,11 +460,10 @@ class WelshWater(WaterCompany):
             if "features" not in response:
                 print("\033[36m" + "\tNo records to fetch" + "\033[0m")
             else:
-                data = response["features"]
-                for location in data:
-                    location = location["attributes"]
-                    df_temp = pd.json_normalize(location)
-                    df = pd.concat([df, df_temp])
+                # Normalise the attributes of all the locations at once, rather than concatenating a row at a time
+                df = pd.json_normalize(
+                    [location["attributes"] for location in response["features"]]
+                )
         else:
             raise Exception(
                 "\tRequest failed with status code {0}, and error message: {1}".format(
@@ -1652,28 +1639,3 @@ def latlong_to_osgb(lat, lon):
     x, y, _ = transform.TransformPoint(lat, lon)
     return x, y
 
-
-def _process_monitor_history_pl(
-    args: Tuple[
-        str,
-        pd.DataFrame,
-        Dict[str, Monitor],
-        Callable[[pd.DataFrame, Monitor], List[Event]],
-    ]
-) -> Tuple[str, List[Event]]:
-    """
-    Process a single monitor's history in parallel. This function is used in
-    the `set_all_histories_parallel` method of the `ThamesWater` class.
-
-    Args:
-        args: A tuple containing:
-            - name: The name of the monitor.
-            - df: The DataFrame containing historical data.
-            - active_monitors: A dictionary of active monitors.
-            - alerts_df_to_events_list: A function to convert DataFrame to events list.
-    """
-    name, df, active_monitors, alerts_df_to_events_list = args
-    subset = df[df["LocationName"] == name]
-    monitor = active_monitors[name]
-    history = alerts_df_to_events_list(subset, monitor)
-    return name, history
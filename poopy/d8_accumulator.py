@@ -9,8 +9,10 @@ in Cython for speed. The approach is linear w.r.t. the number of nodes in the ne
 geospatial rasters, but can also be used with a numpy array of D8 flow directions with some loss of functionality. 
 """
 
+import os
+import tempfile
 import warnings
-from typing import Tuple, List, Union
+from typing import Iterable, Tuple, List, Union
 
 from geojson import MultiLineString
 import json
@@ -19,6 +21,11 @@ from osgeo import gdal
 
 import cfuncs as cf
 
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library json module
+    orjson = None
+
 
 def read_geo_file(filename: str) -> Tuple[np.ndarray, gdal.Dataset]:
     """Reads a geospatial file"""
@@ -45,10 +52,42 @@ def write_geotiff(filename: str, arr: np.ndarray, ds: gdal.Dataset):
     band.ComputeStatistics(False)
 
 
+def _save_array(path: str, arr: np.ndarray):
+    """Saves an array to a .npy file. The file is written to a temporary path and then moved into place, so that
+    a crash or a concurrent reader never sees a partial file"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".npy")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, arr)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
 def write_geojson(filename: str, geojson: dict):
-    """Writes a GeoJSON object to a file"""
-    with open(filename, "w") as f:
-        json.dump(geojson, f)
+    """Writes a GeoJSON object to a file. Uses orjson if it is installed, which is much faster for large objects"""
+    if orjson is None:
+        with open(filename, "w") as f:
+            json.dump(geojson, f)
+    else:
+        with open(filename, "wb") as f:
+            f.write(orjson.dumps(geojson, option=orjson.OPT_SERIALIZE_NUMPY))
+
+
+def write_geojson_features(filename: str, features: Iterable[dict]):
+    """Writes a GeoJSON FeatureCollection to a file one feature at a time, so that the whole collection
+    never needs to be held in memory. Uses orjson if it is installed"""
+    with open(filename, "wb") as f:
+        f.write(b'{"type": "FeatureCollection", "features": [')
+        for i, feature in enumerate(features):
+            if i > 0:
+                f.write(b", ")
+            if orjson is None:
+                f.write(json.dumps(feature).encode())
+            else:
+                f.write(orjson.dumps(feature, option=orjson.OPT_SERIALIZE_NUMPY))
+        f.write(b"]}")
 
 
 class D8Accumulator:
@@ -93,6 +132,8 @@ class D8Accumulator:
     -------
     accumulate(weights : np.ndarray = None)
         Accumulate flow on the grid using the D8 flow directions
+    accumulate_sources(source_nodes : np.ndarray)
+        Count the number of source nodes upstream of each node
     get_channel_segments(field : np.ndarray, threshold : float)
         Get the profile segments of river channels where 'field' is greater than 'threshold'. Used for, e.g., plotting
         the location of a river channel as a line-string.
@@ -100,8 +141,12 @@ class D8Accumulator:
         Extract the downstream profile *from* a given node.
     node_to_coord(node : int)
         Converts a node index to a coordinate pair
+    nodes_to_coords(nodes : np.ndarray)
+        Converts an array of node indices to arrays of coordinates
     coord_to_node(x : float, y : float)
         Converts a coordinate pair to a node index
+    coords_to_nodes(x : np.ndarray, y : np.ndarray)
+        Converts arrays of coordinates to node indices
     """
 
     def __init__(self, filename: str):
@@ -123,6 +168,8 @@ class D8Accumulator:
         self._order = cf.build_ordered_list_iterative(
             self.receivers, self.baselevel_nodes
         )
+        # Donor arrays of the network, built when first needed (see `_donor_arrays`)
+        self._donors = None
 
     def accumulate(self, weights: np.ndarray = None) -> np.ndarray:
         """Accumulate flow on the grid using the D8 flow directions
@@ -146,12 +193,36 @@ class D8Accumulator:
         else:
             if weights.shape != self.arr.shape:
                 raise ValueError("Weights must be have same shape as D8 array")
-            weights = weights.flatten()
+            weights = weights.ravel()
 
         return cf.accumulate_flow(self.receivers, self.order, weights=weights).reshape(
             self._arr.shape
         )
 
+    def accumulate_sources(self, source_nodes: np.ndarray) -> np.ndarray:
+        """Count the number of source nodes upstream of (and including) each node. Equivalent to accumulating
+        a weights array that is 1 at the source nodes and 0 elsewhere, but the array is accumulated in place
+        rather than being flattened and copied. The counts are accumulated as 32 bit integers, which halves
+        the memory traffic of the accumulation, and returned as floats.
+
+        Parameters
+        ----------
+        source_nodes : np.ndarray
+            Array of the node IDs of the sources
+
+        Returns
+        -------
+        np.ndarray [ndim = 2]
+            Array of the number of sources upstream of each node
+        """
+        if len(source_nodes) == 0:
+            # Nothing to accumulate (e.g., when no monitors are discharging), so skip the sweep over the network
+            return np.zeros(self._arr.shape, dtype=np.float64)
+        accum = np.zeros(self.arr.size, dtype=np.intc)
+        accum[source_nodes] = 1
+        cf.accumulate_flow_inplace(self._receivers, self._order, accum)
+        return accum.astype(np.float64).reshape(self._arr.shape)
+
     def get_channel_segments(
         self, field: np.ndarray, threshold: float
     ) -> Union[List[List[int]], MultiLineString]:
@@ -174,19 +245,15 @@ class D8Accumulator:
             - GeoJSON MultiLineString object of the profile segments if the D8 flow grid is a geospatial raster.
             - List of segments of node IDs if the D8 flow grid is a numpy array (and no GDAL Dataset object exists)
         """
-        # Nodes where field is greater than threshold
-        gteq_thresh = (field > threshold).flatten()
-        # Nodes that are baselevel
-        is_baselevel = np.asarray(self.receivers) == np.arange(len(self.receivers))
-        # Starting nodes are where field is greater than threshold and are also baselevel
-        starting_nodes = np.where(np.logical_and(gteq_thresh, is_baselevel))[0]
-
-        n_donors = cf.count_donors(self._receivers)
-        delta = cf.ndonors_to_delta(n_donors)
-        donors = cf.make_donor_array(self._receivers, delta)
+        field = np.ravel(field)
+        # Starting nodes are baselevel nodes where field is greater than threshold. Only the (stored) baselevel
+        # nodes are checked, rather than comparing the whole grid against the threshold.
+        starting_nodes = self._baselevel_nodes[field[self._baselevel_nodes] > threshold]
+
+        delta, donors = self._donor_arrays()
         # Get the profile segments of node IDs
         segments = cf.get_channel_segments(
-            starting_nodes, delta, donors, field.flatten(), threshold
+            starting_nodes, delta, donors, field, threshold
         )
         # Convert to x,y indices
         if self.ds is None:
@@ -206,6 +273,15 @@ class D8Accumulator:
             )
             return MultiLineString(coord_segs)
 
+    def _donor_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the delta index array and the donor array of the network (see `cfuncs.make_donor_array`).
+        These only depend on the receivers, so they are built when first needed and then stored"""
+        if self._donors is None:
+            n_donors = cf.count_donors(self._receivers)
+            delta = cf.ndonors_to_delta(n_donors)
+            self._donors = (delta, cf.make_donor_array(self._receivers, delta))
+        return self._donors
+
     def get_profile(self, start_node: int) -> Tuple[np.ndarray[int], np.ndarray[float]]:
         """Extract the downstream profile *from* a given node. Returns the profile as a list
         of node IDs in order upstream to downstream. Also returns the distance along the profile
@@ -233,7 +309,7 @@ class D8Accumulator:
         dx = self.ds.GetGeoTransform()[1]
         dy = self.ds.GetGeoTransform()[5] * -1
         profile, distance = cf.get_profile(
-            start_node, dx, dy, self._receivers, self.arr.flatten()
+            start_node, dx, dy, self._receivers, self.arr.ravel()
         )
         # Check length of outputs
         if len(profile) == 0:
@@ -246,7 +322,7 @@ class D8Accumulator:
     def node_to_coord(self, node: int) -> Tuple[float, float]:
         """Converts a node index to a coordinate pair for the centre of the pixel"""
         nrows, ncols = self.arr.shape
-        if node > ncols * nrows or node < 0:
+        if node >= ncols * nrows or node < 0:
             raise ValueError("Node is out of bounds")
         x_ind = node % ncols
         y_ind = node // ncols
@@ -260,6 +336,23 @@ class D8Accumulator:
         y_coord += dy / 2  # recall that dy is negative
         return x_coord, y_coord
 
+    def nodes_to_coords(self, nodes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Converts an array of node indices to arrays of the x and y coordinates of the centres of the pixels,
+        as in `node_to_coord`"""
+        nrows, ncols = self.arr.shape
+        nodes = np.asarray(nodes)
+        if np.any((nodes >= ncols * nrows) | (nodes < 0)):
+            raise ValueError("Node is out of bounds")
+        x_ind = nodes % ncols
+        y_ind = nodes // ncols
+        ulx, dx, _, uly, _, dy = self.ds.GetGeoTransform()
+        # Coords of the upper left corner of the pixel, plus dx/2 and dy/2 to get to the center (recall dy is negative)
+        x_coord = ulx + dx * x_ind
+        y_coord = uly + dy * y_ind
+        x_coord += dx / 2
+        y_coord += dy / 2
+        return x_coord, y_coord
+
     def coord_to_node(self, x: float, y: float) -> int:
         """Converts a coordinate pair to a node index. Returns the node index of the pixel that contains the coordinate"""
         nrows, ncols = self.arr.shape
@@ -268,10 +361,31 @@ class D8Accumulator:
         # Casting to int rounds towards zero ('floor' for positive numbers; e.g, int(3.9) = 3)
         y_ind = int((y - uly) / dy)
         out = y_ind * ncols + x_ind
-        if out > ncols * nrows or out < 0:
+        if out >= ncols * nrows or out < 0:
             raise ValueError("Coordinate is out of bounds")
         return out
 
+    def coords_to_nodes(
+        self, x: np.ndarray, y: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Converts arrays of coordinates to node indices, as in `coord_to_node`. Returns the node indices and a boolean
+        array that is True where the coordinate is in bounds (the node indices of out of bounds coordinates are meaningless)
+        """
+        nrows, ncols = self.arr.shape
+        ulx, dx, _, uly, _, dy = self.ds.GetGeoTransform()
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        # Missing (NaN) coordinates are out of bounds. Replace them before casting, which is undefined for NaN.
+        finite = np.isfinite(x) & np.isfinite(y)
+        x = np.where(finite, x, ulx)
+        y = np.where(finite, y, uly)
+        # Casting to int rounds towards zero, as in coord_to_node
+        x_ind = ((x - ulx) / dx).astype(np.int64)
+        y_ind = ((y - uly) / dy).astype(np.int64)
+        out = y_ind * ncols + x_ind
+        in_bounds = finite & (out >= 0) & (out < ncols * nrows)
+        return out, in_bounds
+
     @property
     def receivers(self) -> np.ndarray:
         """Array of receiver nodes (i.e., the ID of the node that receives the flow from the i'th node)"""
@@ -325,6 +439,71 @@ class D8Accumulator:
         self._order = cf.build_ordered_list_iterative(
             self.receivers, self.baselevel_nodes
         )
+        self._donors = None
+
+    @classmethod
+    def from_cache(cls, filename: str):
+        """
+        Creates a D8Accumulator from a geospatial file, as in the constructor, but caches the flow direction,
+        receiver and order arrays in .npy files next to the file. On later calls these are memory-mapped rather than
+        decoded and rebuilt, so the raster is only read and the network only traversed once, and pages are shared
+        between processes by the OS. The cache is rebuilt if the geospatial file is newer than it.
+
+        Parameters
+        ----------
+        filename : str
+            Path to the D8 flow grid
+        """
+        if not isinstance(filename, str):
+            raise TypeError("Filename must be a string")
+        paths = (filename + ".d8.npy", filename + ".receivers.npy", filename + ".order.npy")
+        mtime = os.path.getmtime(filename)
+        instance = None
+        if all(os.path.exists(path) and os.path.getmtime(path) >= mtime for path in paths):
+            instance = cls._load_cache(filename, paths)
+        if instance is None:
+            instance = cls(filename)
+            try:
+                for path, arr in zip(paths, (instance.arr, instance.receivers, instance.order)):
+                    _save_array(path, arr)
+            except OSError as e:
+                warnings.warn(f"\nCould not cache flow network arrays: {e}")
+        return instance
+
+    @classmethod
+    def _load_cache(cls, filename: str, paths: Tuple[str, str, str]):
+        """
+        Loads the arrays cached by `from_cache`, memory-mapping them. Returns None, having deleted the cache, if it
+        cannot be read (e.g., a truncated file) or does not match the flow grid.
+        """
+        instance = cls.__new__(cls)
+        # Opening the dataset only reads its metadata (e.g., the geotransform), not the raster itself
+        instance._ds = gdal.Open(filename)
+        try:
+            instance._arr, instance._receivers, instance._order = (
+                np.load(path, mmap_mode="r") for path in paths
+            )
+            valid = (
+                instance._arr.shape == (instance._ds.RasterYSize, instance._ds.RasterXSize)
+                and instance._receivers.size == instance._arr.size
+                and instance._order.size == instance._arr.size
+                and instance._receivers.dtype == np.int32
+            )
+        except (ValueError, OSError):
+            valid = False
+        if not valid:
+            # Cache is unreadable or does not match the flow grid (or was written by an older version)
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            return None
+        instance._baselevel_nodes = np.where(
+            instance.receivers == np.arange(len(instance.receivers))
+        )[0]
+        instance._donors = None
+        return instance
 
     @classmethod
     def from_array(cls, arr: np.ndarray):
@@ -351,4 +530,5 @@ class D8Accumulator:
         instance._order = cf.build_ordered_list_iterative(
             instance.receivers, instance.baselevel_nodes
         )
+        instance._donors = None
         return instance
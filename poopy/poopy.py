@@ -1,10 +1,21 @@
+import contextlib
+import copy
 import datetime
+import functools
+import glob
+import hashlib
+import sys
+import tempfile
+import threading
 import warnings
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional, Union, Tuple
+from enum import IntEnum
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Union, Tuple
 import os
 import requests
 
+import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
@@ -12,7 +23,30 @@ import pooch
 from geojson import MultiLineString, Feature, FeatureCollection, Point
 from matplotlib.colors import LogNorm
 
-from poopy.d8_accumulator import D8Accumulator
+from poopy.d8_accumulator import D8Accumulator, write_geojson_features
+
+# The alert types used in the alerts tables. Stored as a categorical so that the column is held as
+# small integer codes rather than one Python string per row.
+_ALERT_TYPES = ("Start", "Stop", "Offline start", "Offline stop")
+_VALID_ALERT_TYPES = frozenset(_ALERT_TYPES)
+_ALERT_TYPE_DTYPE = pd.CategoricalDtype(categories=list(_ALERT_TYPES))
+
+
+class EventType(IntEnum):
+    """Integer codes for the types of Event. Used for fast comparisons in place of the `event_type` strings."""
+
+    UNKNOWN = 0
+    DISCHARGING = 1
+    OFFLINE = 2
+    NOT_DISCHARGING = 3
+
+
+# The alert type that marks the start of an ongoing event of each type.
+_EVENT_TO_ALERT = {
+    "Not Discharging": "Stop",
+    "Discharging": "Start",
+    "Offline": "Offline start",
+}
 
 
 class Monitor:
@@ -42,6 +76,26 @@ class Monitor:
         recent_discharge_at: Returns whether there was a discharge event in the preceding 48 hours of a specified time.
     """
 
+    # Companies can have many thousands of monitors, so we avoid a per-instance __dict__
+    __slots__ = (
+        "_site_name",
+        "_permit_number",
+        "_x_coord",
+        "_y_coord",
+        "_receiving_watercourse",
+        "_water_company",
+        "_discharge_in_last_48h",
+        "_current_event",
+        "_history",
+        "_history_starts",
+        "_history_ends",
+        "_history_is_discharge",
+        "_history_ascending",
+        "_discharge_starts",
+        "_discharge_ends",
+        "_discharge_cumsum",
+    )
+
     def __init__(
         self,
         site_name: str,
@@ -64,15 +118,27 @@ class Monitor:
             water_company: The water company that the monitor belongs to.
             discharge_in_last_48h: Whether the monitor has discharged in the last 48 hours.
         """
-        self._site_name: str = site_name
-        self._permit_number: str = permit_number
+        # Many monitors share permit numbers and watercourses, so equal strings are stored once
+        self._site_name: str = _intern(site_name)
+        self._permit_number: str = _intern(permit_number)
         self._x_coord: float = x_coord
         self._y_coord: float = y_coord
-        self._receiving_watercourse: str = receiving_watercourse
+        self._receiving_watercourse: str = _intern(receiving_watercourse)
         self._water_company: WaterCompany = water_company
         self._discharge_in_last_48h: bool = discharge_in_last_48h
         self._current_event: Event = None
         self._history: List[Event] = None
+        # Arrays of event start and end times (and which events are discharges) built when the history is set
+        self._history_starts: np.ndarray = None
+        self._history_ends: np.ndarray = None
+        self._history_is_discharge: np.ndarray = None
+        # The start and end times in ascending order, if the history is ordered so that they can be binary searched
+        self._history_ascending: Tuple[np.ndarray, np.ndarray] = None
+        # Start and end times of discharge events only, sorted by end time (ongoing events last)
+        self._discharge_starts: np.ndarray = None
+        self._discharge_ends: np.ndarray = None
+        # Cumulative durations (minutes) of the completed discharge events, if their start times are known and sorted
+        self._discharge_cumsum: np.ndarray = None
 
     @property
     def site_name(self) -> str:
@@ -107,7 +173,7 @@ class Monitor:
     @property
     def current_status(self) -> str:
         """Return the current status of the monitor."""
-        return self._current_event.event_type
+        return self._current_event._event_type
 
     @property
     def current_event(self) -> "Event":
@@ -120,14 +186,111 @@ class Monitor:
             raise ValueError("Current event is not set.")
         return self._current_event
 
-    def get_history(self, verbose: bool = False) -> None:
+    def get_history(self, verbose: bool = False, use_cache: bool = False) -> None:
         """
         Get the historical data for the monitor and store it in the history attribute.
 
         Args:
             verbose: Whether to print the dataframe of API responses when the history is set. Defaults to False.
+            use_cache: Whether to reuse a copy of the history saved on disk earlier the same day, rather than fetching
+                it from the API again. The copy is only reused while its ongoing event is still the monitor's current
+                event. A copy is saved whenever the history is fetched with this option. Defaults to False, as the
+                history of a monitor can change during the day.
+        """
+        if use_cache:
+            path = self._history_cache_path()
+            history = self._load_history(path) if os.path.exists(path) else None
+            if history is not None:
+                self.history = history
+                return
+        self.history = self.water_company._fetch_monitor_history(self, verbose=verbose)
+        # Companies without historical data return None, which is not cached
+        if use_cache and self._history is not None:
+            self._save_history(path)
+
+    def _history_cache_path(self) -> str:
+        """
+        Returns the path of today's copy of the history of the monitor in the pooch cache directory. Site names are
+        hashed, as they are not always valid file names (and permit numbers are shared between monitors).
+        """
+        cache_dir = pooch.os_cache("poopy")
+        os.makedirs(cache_dir, exist_ok=True)
+        site = hashlib.sha1(self.site_name.encode()).hexdigest()[:16]
+        return os.path.join(
+            cache_dir,
+            f"{self.water_company.name}_{site}_{datetime.date.today().isoformat()}.npz",
+        )
+
+    def _save_history(self, path: str) -> None:
         """
-        self._history = self.water_company._fetch_monitor_history(self, verbose=verbose)
+        Saves the history of the monitor to the given path as arrays of start and end times, event type codes and
+        whether each event is ongoing. The file is written to a temporary path and then moved into place, so a
+        concurrent reader never sees a partial file.
+        """
+        history = self.history
+        codes = np.fromiter(
+            (event._event_type_code for event in history), dtype=np.int8, count=len(history)
+        )
+        ongoing = np.fromiter((event._ongoing for event in history), dtype=bool, count=len(history))
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    starts=self._history_starts,
+                    ends=self._history_ends,
+                    codes=codes,
+                    ongoing=ongoing,
+                )
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        # Copies saved on earlier days are never used again, so they are removed to stop the cache growing
+        prefix = os.path.basename(path).rsplit("_", 1)[0]
+        pattern = os.path.join(glob.escape(os.path.dirname(path)), glob.escape(prefix) + "_*.npz")
+        for old_path in glob.glob(pattern):
+            if old_path != path:
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+
+    def _load_history(self, path: str) -> Optional[List["Event"]]:
+        """
+        Loads a history of the monitor saved by `_save_history`, rebuilding its events. The ongoing event of the saved
+        history is replaced by the monitor's current event, as in a freshly fetched history. Returns None if the saved
+        history is stale, i.e. its ongoing event is not the monitor's current event (e.g., after an `update`).
+        """
+        event_classes = {
+            EventType.DISCHARGING: Discharge,
+            EventType.OFFLINE: Offline,
+            EventType.NOT_DISCHARGING: NoDischarge,
+        }
+        with np.load(path) as data:
+            starts = data["starts"]
+            ends = data["ends"]
+            codes = data["codes"]
+            ongoing = data["ongoing"]
+        current = self._current_event
+        live = np.flatnonzero(ongoing)
+        if current is None:
+            if len(live) > 0:
+                return None
+        else:
+            if len(live) != 1 or codes[live[0]] != current._event_type_code:
+                return None
+            saved_start = starts[live[0]]
+            current_start = _to_datetime64([current._start_time])[0]
+            if not (saved_start == current_start or (np.isnat(saved_start) and np.isnat(current_start))):
+                return None
+        # Converting to object arrays gives datetimes, with None in place of NaT
+        return [
+            current if is_ongoing else event_classes[code](self, is_ongoing, start, end)
+            for code, is_ongoing, start, end in zip(
+                codes.tolist(), ongoing.tolist(), starts.astype(object), ends.astype(object)
+            )
+        ]
 
     @property
     def history(self) -> List["Event"]:
@@ -140,6 +303,56 @@ class Monitor:
             raise ValueError("History is not yet set!")
         return self._history
 
+    @history.setter
+    def history(self, history: List["Event"]) -> None:
+        """Set the history of the monitor, caching arrays of the start and end times of each event.
+        Missing start times, and the end times of ongoing events, are stored as NaT. Setting the history to None
+        (e.g., where the API of a water company has no historical data) clears the cached arrays.
+        """
+        self._history = history
+        if history is None:
+            self._history_starts = None
+            self._history_ends = None
+            self._history_is_discharge = None
+            self._history_ascending = None
+            self._discharge_starts = None
+            self._discharge_ends = None
+            self._discharge_cumsum = None
+            return
+        self._history_starts = _to_datetime64([event._start_time for event in history])
+        self._history_ends = _to_datetime64([event._end_time for event in history])
+        self._history_is_discharge = np.fromiter(
+            (event._event_type_code == EventType.DISCHARGING for event in history),
+            dtype=bool,
+            count=len(history),
+        )
+        starts = self._history_starts
+        ordered = not np.isnat(starts).any() and np.all(starts[:-1] >= starts[1:])
+        if ordered and _is_descending_history(self._history_ends):
+            self._history_ascending = (starts[::-1].copy(), self._history_ends[::-1].copy())
+        else:
+            self._history_ascending = None
+        starts = self._history_starts[self._history_is_discharge]
+        ends = self._history_ends[self._history_is_discharge]
+        if _is_descending_history(ends):
+            # The usual case: reversing the history puts the events in order of end time, with no need to sort
+            self._discharge_starts = starts[::-1]
+            self._discharge_ends = ends[::-1]
+        else:
+            # NaT (i.e., ongoing) end times sort to the end
+            order = np.argsort(ends, kind="stable")
+            self._discharge_starts = starts[order]
+            self._discharge_ends = ends[order]
+        # For completed events with known start times that do not overlap (the usual case), the starts are in the
+        # same order as the ends, and a running total of durations answers `total_discharge` without a scan
+        n_closed = np.count_nonzero(~np.isnat(self._discharge_ends))
+        starts = self._discharge_starts[:n_closed]
+        if np.isnat(starts).any() or np.any(starts[1:] < starts[:-1]):
+            self._discharge_cumsum = None
+        else:
+            durations = (self._discharge_ends[:n_closed] - starts) / np.timedelta64(1, "m")
+            self._discharge_cumsum = np.concatenate(([0.0], np.cumsum(durations)))
+
     @property
     def discharge_in_last_48h(self) -> bool:
         # Raise a warning if the discharge_in_last_48h is not set
@@ -162,6 +375,7 @@ class Monitor:
             raise ValueError("Current Event must be ongoing.")
         else:
             self._current_event = event
+            self._water_company._monitor_status_changed(self)
 
     def print_status(self) -> None:
         """Print the current status of the monitor."""
@@ -171,47 +385,67 @@ class Monitor:
 
     def total_discharge(self, since: datetime.datetime = None) -> float:
         """Returns the total discharge in minutes since the given datetime.
-        If no datetime is given, it will return the total discharge since records began
+        If no datetime is given, it will return the total discharge since records began.
+        Discharge events without a start time are not counted.
         """
-        history = self.history
-        total = 0.0
+        if self._history is None:
+            raise ValueError("History is not yet set!")
         if since is None:
             since = datetime.datetime(2000, 1, 1)  # A long time ago
-        for event in history:
-            if event.event_type == "Discharging":
-                if event.ongoing:
-                    if event.start_time < since:
-                        # If the start time is before the cut off date, we can take the difference between the current time and the cut off date
-                        total += (datetime.datetime.now() - since).total_seconds() / 60
-                    else:
-                        total += event.duration
-                else:
-                    # If the end time is before the cut off date, we can skip this event
-                    if event.end_time < since:
-                        continue
-                    # If the endtime is after since but start_time is before, we take the difference between the end time and since
-                    elif (event.end_time > since) and (event.start_time < since):
-                        total += (event.end_time - since).total_seconds() / 60
-                    elif event.end_time > since:
-                        total += event.duration
-        return total
+        now = np.datetime64(self._water_company._now(), "us")
+        since = np.datetime64(since, "us")
+        # Only events that end after the cut off date contribute, and these are at the end of the sorted arrays
+        first = np.searchsorted(self._discharge_ends, since, side="right")
+        if self._discharge_cumsum is not None:
+            return self._cumulative_discharge(since, first, now)
+        starts = self._discharge_starts[first:]
+        ends = self._discharge_ends[first:]
+        # Ongoing events run until now
+        ends = np.where(np.isnat(ends), now, ends)
+        has_start = ~np.isnat(starts)
+        # Clip each event to start no earlier than the cut off date
+        starts = np.maximum(starts[has_start], since)
+        durations = ends[has_start] - starts
+        # Events that ended before the cut off date contribute nothing
+        durations = durations[durations > np.timedelta64(0, "us")]
+        return float(durations.sum() / np.timedelta64(1, "m"))
+
+    def _cumulative_discharge(
+        self, since: np.datetime64, first: int, now: np.datetime64
+    ) -> float:
+        """Returns the total discharge in minutes since `since` using the running total of completed discharge durations.
+        `first` is the index of the first discharge event (in order of end time) that ends after `since`.
+        """
+        n_closed = len(self._discharge_cumsum) - 1
+        # Completed events that start after the cut off date contribute their full duration...
+        full = max(first, np.searchsorted(self._discharge_starts[:n_closed], since))
+        total = self._discharge_cumsum[n_closed] - self._discharge_cumsum[full]
+        # ...those that span it are clipped to start at the cut off date...
+        total += (self._discharge_ends[first:full] - since).sum() / np.timedelta64(1, "m")
+        # ...and ongoing events run until now
+        starts = self._discharge_starts[n_closed:]
+        starts = np.maximum(starts[~np.isnat(starts)], since)
+        durations = now - starts
+        durations = durations[durations > np.timedelta64(0, "us")]
+        total += durations.sum() / np.timedelta64(1, "m")
+        return float(total)
 
     def total_discharge_last_6_months(self) -> float:
         """Returns the total discharge in minutes in the last 6 months (183 days)"""
         return self.total_discharge(
-            since=datetime.datetime.now() - datetime.timedelta(days=183)
+            since=self._water_company._now() - datetime.timedelta(days=183)
         )
 
     def total_discharge_last_12_months(self) -> float:
         """Returns the total discharge in minutes in the last 12 months (365 days)"""
         return self.total_discharge(
-            since=datetime.datetime.now() - datetime.timedelta(days=365)
+            since=self._water_company._now() - datetime.timedelta(days=365)
         )
 
     def total_discharge_since_start_of_year(self) -> float:
         """Returns the total discharge in minutes since the start of the year"""
         return self.total_discharge(
-            since=datetime.datetime(datetime.datetime.now().year, 1, 1)
+            since=datetime.datetime(self._water_company._now().year, 1, 1)
         )
 
     def plot_history(self, since: datetime.datetime = None) -> None:
@@ -228,34 +462,43 @@ class Monitor:
             )
 
         else:
+            now = self._water_company._now()
+            # Create a figure that is wide and not very tall
             plt.figure(figsize=(10, 2))
-            for event in events:
-                start = event.start_time
-                if event.ongoing:
-                    end = datetime.datetime.now()
-                else:
-                    end = event.end_time
-                if event.event_type == "Discharging":
-                    color = "#8B4513"
-                if event.event_type == "Offline":
-                    color = "grey"
-                if event.event_type == "Not Discharging":
-                    continue
-
-                # Create a figure that is wide and not very tall
-                # Plot a polygon for each event that extends from the start to the end of the event
-                # and from y = 0 to y = 1
-                plt.fill_between([start, end], 0, 1, color=color)
-                # Set the title to the name of the monitor
+            ax = plt.gca()
+            ax.xaxis_date()
+            event_types = np.fromiter(
+                (event._event_type_code for event in events),
+                dtype=np.int8,
+                count=len(events),
+            )
+            starts = self._history_starts
+            # Ongoing events are plotted up to now
+            ends = np.where(
+                np.isnat(self._history_ends),
+                np.datetime64(now, "us"),
+                self._history_ends,
+            )
+            has_start = ~np.isnat(starts)
+            for event_type, color in (
+                (EventType.DISCHARGING, "#8B4513"),
+                (EventType.OFFLINE, "grey"),
+            ):
+                # Plot a single set of bars for all events of this type, each extending from the start to the end
+                # of the event and from y = 0 to y = 1
+                selected = has_start & (event_types == event_type)
+                left = mdates.date2num(starts[selected])
+                width = mdates.date2num(ends[selected]) - left
+                ax.broken_barh(list(zip(left, width)), (0, 1), facecolors=color)
             # Remove all y axis ticks and labels
             plt.yticks([])
             plt.ylabel("")
             plt.ylim(0, 1)
             # Set the x axis limits to the start and end of the event list
             if since is None:
-                minx, maxx = events[-1].start_time, datetime.datetime.now()
+                minx, maxx = events[-1].start_time, now
             else:
-                minx, maxx = since, datetime.datetime.now()
+                minx, maxx = since, now
             plt.xlim(minx, maxx)
             total_discharge = self.total_discharge(since=since)
             plt.title(
@@ -278,7 +521,7 @@ class Monitor:
             The event that is ongoing at the given time for the given monitor.
         """
         out = None
-        now = datetime.datetime.now()
+        now = self._water_company._now()
         # Check if time is in the future and return none raising a warning in red:
         if time > now:
             warnings.warn(
@@ -287,16 +530,11 @@ class Monitor:
                 + "\033[0m"
             )
             return out
-        for event in self.history:
-            start = event.start_time
-            if event.ongoing:
-                end = now
-            else:
-                end = event.end_time
-            if start < time and time < end:
-                # If the event is not ongoing but the time is between the start and end time, then it is the current event
-                out = event
-                return out
+        if self._history is None:
+            raise ValueError("History is not yet set!")
+        i = self._event_index_at(np.datetime64(time, "us"), now)
+        if i is not None:
+            return self._history[i]
         warnings.warn(
             f"\033[31m\n! WARNING ! No event found at {time} for {self.site_name}. \nProbably the monitor was not active at that time OR has no recorded events. \033[0m"
         )
@@ -316,55 +554,71 @@ class Monitor:
             ValueError: If the target time is in the future.
         """
 
-        now = datetime.datetime.now()
+        now = self._water_company._now()
         discharge_in_last_48_hours: bool = False
         # Raise a value error if the target time is in the future
         if time > now:
             raise ValueError("The target time cannot be in the future.")
 
-        # Loop through the events in the monitor's history
-        for i in range(len(self.history)):
-            event = self.history[i]
-            start = event.start_time
-            if event.ongoing:
-                end = now
-            else:
-                end = event.end_time
-            if start < time and time < end:
-                # We have found the event containing target time
-                if event.event_type == "Discharging":
-                    # This event itself is a discharge, so we can quit the loop
-                    discharge_in_last_48_hours = True
-                    return discharge_in_last_48_hours
-                else:
-                    # This event was not a discharge, but we check the preceding events for a recent discharge
-                    while i + 2 < len(self.history):
-                        prev_event = self.history[i + 1]
-                        time_diff = time - prev_event.end_time
-                        if time_diff > datetime.timedelta(hours=48):
-                            # This event ended more than 48 hours before target time, so we can finish the search
-                            return discharge_in_last_48_hours
-                        elif prev_event.event_type == "Discharging":
-                            # This event was a discharge and ended within 48 hours of target time so we can quit having found a recent discharge
-                            discharge_in_last_48_hours = True
-                            return discharge_in_last_48_hours
-                        else:
-                            # This event was within 48 hours but was not a discharge, so we move on to the next event to check that one too
-                            i += 1
-                    # Searched all the previous events and found no recent discharges so we can finish the search, returning False
-                    return discharge_in_last_48_hours
+        history = self.history
+        target = np.datetime64(time, "us")
+        # Find the event containing the target time
+        i = self._event_index_at(target, now)
+        if i is not None:
+            if self._history_is_discharge[i]:
+                # This event itself is a discharge
+                discharge_in_last_48_hours = True
+                return discharge_in_last_48_hours
+            # This event was not a discharge, so we check the preceding events (all but the oldest) for a recent
+            # discharge. The search stops at the first event that either ended more than 48 hours before the target
+            # time (no recent discharge) or is a discharge (a recent discharge).
+            if self._history_ascending is not None:
+                # The end times are descending, so the events that ended within 48 hours come first
+                ends = self._history_ascending[1]
+                too_old = np.searchsorted(ends, target - np.timedelta64(48, "h"), side="left")
+                last = min(max(i + 1, len(history) - too_old), len(history) - 1)
+                discharge_in_last_48_hours = bool(self._history_is_discharge[i + 1 : last].any())
+                return discharge_in_last_48_hours
+            preceding = slice(i + 1, len(history) - 1)
+            too_old = (target - self._history_ends[preceding]) > np.timedelta64(48, "h")
+            stops = np.flatnonzero(too_old | self._history_is_discharge[preceding])
+            if stops.size > 0 and not too_old[stops[0]]:
+                discharge_in_last_48_hours = True
+            return discharge_in_last_48_hours
         # If we reach this point, it means that there were no events found at the target time
         warnings.warn(
             f"\033[31m\n! WARNING ! No event found at {time} for {self.site_name}. \nProbably the monitor was not active at that time OR has no recorded events. \033[0m"
         )
         return discharge_in_last_48_hours
 
+    def _event_index_at(self, target: np.datetime64, now: datetime.datetime) -> Optional[int]:
+        """
+        Returns the index in the history of the most recent event containing the target time, or None if there is
+        no such event. Ongoing events run until now, and events without a start time are never matched.
+        """
+        if self._history_ascending is not None:
+            # The starts and ends are both descending, so only the latest event to start before the target can
+            # contain it
+            starts = self._history_ascending[0]
+            n_before = np.searchsorted(starts, target, side="left")
+            if n_before == 0:
+                return None
+            i = len(starts) - n_before
+            end = self._history_ends[i]
+            if np.isnat(end):
+                end = np.datetime64(now, "us")
+            return i if target < end else None
+        ends = self._history_ends
+        ends = np.where(np.isnat(ends), np.datetime64(now, "us"), ends)
+        matches = np.flatnonzero((self._history_starts < target) & (target < ends))
+        if matches.size > 0:
+            # The first match is the most recent event containing the time
+            return int(matches[0])
+        return None
+
     def _history_masks(
         self, times: List[datetime.datetime]
     ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
-        online = np.zeros(len(times), dtype=bool)
-        active = np.zeros(len(times), dtype=bool)
-        recent = np.zeros(len(times), dtype=bool)
         """
         Returns three boolean arrays that indicate, respectively, whether the monitor was online, active,
         or recently active (within 48 hours) at each time given in the times list. The times list should be
@@ -378,56 +632,62 @@ class Monitor:
             A tuple of three boolean arrays indicating whether the monitor was online, active, or recently active.
 
         """
-
+        n = len(times)
         if len(self.history) == 0:
             print(f"Monitor {self.site_name} has no recorded events")
-            return online, active, recent
-
-        first_event = round_time_down_15(self.history[-1].start_time)
-        # If first event is before the first time in the times list, then we need to fill the online array with 1s
-        if first_event < times[0]:
-            online[:] = True
-        else:
-            online[times.index(first_event) :] = True
-
-        for event in self.history:
-            if event.event_type == "Discharging" or event.event_type == "Offline":
-                start_round = round_time_down_15(event.start_time)
-                if start_round < times[0]:
-                    # Quit loop if start_round is before the first time in the times list
-                    break
-                if event.ongoing:
-                    # If the event is ongoing, then we can set the active array to True from the start_round to the end of
-                    # the array
-                    if event.event_type == "Discharging":
-                        active[times.index(start_round) :] = True
-                        recent[times.index(start_round) :] = True
-                    else:
-                        online[times.index(start_round) :] = False
-                else:
-                    # If the event is not ongoing, then we can set the active array to True from the start_round to the
-                    # end_round
-                    end_round = round_time_up_15(event.end_time)
-                    if event.event_type == "Discharging":
-                        active[times.index(start_round) : times.index(end_round)] = True
-                        # Set recent to True from start_round to 48 hours after end_round
-                        recent_end = end_round + datetime.timedelta(hours=48)
-                        if recent_end > times[-1]:
-                            # If recent_end is after the end of the array, then set recent to True from start_round to the end of the array
-                            recent[times.index(start_round) :] = True
-                        else:
-                            recent[
-                                times.index(start_round) : times.index(recent_end)
-                            ] = True
-                    else:
-                        online[times.index(start_round) : times.index(end_round)] = (
-                            False
-                        )
-
+            return np.zeros(n, dtype=bool), np.zeros(n, dtype=bool), np.zeros(n, dtype=bool)
+
+        # Work in integer microseconds. The times are regularly spaced, so the index of a (rounded) time is found by
+        # arithmetic, and every event is handled at once rather than in a Python loop.
+        step = 15 * 60 * 10**6
+        t0 = np.datetime64(times[0], "us").astype(np.int64)
+        t_last = np.datetime64(times[-1], "us").astype(np.int64)
+
+        def index(time: np.ndarray) -> np.ndarray:
+            # Times after the end of the list map to its end
+            return np.minimum(n, (time - t0) // step)
+
+        # Events without a start time (e.g., a current event whose start is unknown) cannot be placed in the times
+        # list, so they are left out. NaT times are replaced by zero before rounding, as NaT is the minimum int64.
+        has_start = ~np.isnat(self._history_starts)
+        ongoing = np.isnat(self._history_ends)
+        known = np.flatnonzero(has_start)
+        if len(known) == 0:
+            return np.zeros(n, dtype=bool), np.zeros(n, dtype=bool), np.zeros(n, dtype=bool)
+        # Round down to 15 minutes, discarding seconds. Rounding up always adds 15 minutes to this.
+        minutes = np.where(has_start, self._history_starts.astype("datetime64[m]").astype(np.int64), 0)
+        start_round = (minutes - minutes % 15) * 60 * 10**6
+        minutes = np.where(ongoing, 0, self._history_ends.astype("datetime64[m]").astype(np.int64))
+        end_round = (minutes - minutes % 15 + 15) * 60 * 10**6
+
+        online = np.zeros(n, dtype=bool)
+        # If the first event is before the first time in the times list, then the monitor is online throughout
+        online[max(0, index(start_round[known[-1]])) :] = True
+
+        codes = np.fromiter(
+            (event._event_type_code for event in self.history), dtype=np.int8, count=len(self.history)
+        )
+        selected = np.flatnonzero(
+            has_start & ((codes == EventType.DISCHARGING) | (codes == EventType.OFFLINE))
+        )
+        # Events are stored most recent first, so stop at the first one that starts before the times list
+        too_early = np.flatnonzero(start_round[selected] < t0)
+        if len(too_early) > 0:
+            selected = selected[: too_early[0]]
+        is_discharge = codes[selected] == EventType.DISCHARGING
+        first = index(start_round[selected])
+        last = np.where(ongoing[selected], n, index(end_round[selected]))
+        # Discharges count as recent until 48 hours after they end
+        recent_end = end_round[selected] + 48 * 60 * 60 * 10**6
+        last_recent = np.where(ongoing[selected] | (recent_end > t_last), n, index(recent_end))
+
+        active = _interval_mask(first[is_discharge], last[is_discharge], n)
+        recent = _interval_mask(first[is_discharge], last_recent[is_discharge], n)
+        online &= ~_interval_mask(first[~is_discharge], last[~is_discharge], n)
         return online, active, recent
 
 
-class Event(ABC):
+class Event:
     """A class to represent an event at a CSO monitor.
 
     Attributes:
@@ -440,10 +700,32 @@ class Event(ABC):
 
     Methods:
         summary: Print a summary of the event.
+        duration_at: Return the duration of the event, measuring an ongoing event up to a given time.
+        live_duration: Return the duration of the event, measuring an ongoing event up to the current time.
 
     """
 
-    @abstractmethod
+    # Histories can contain millions of events, so we avoid a per-instance __dict__
+    __slots__ = (
+        "_monitor",
+        "_start_time",
+        "_ongoing",
+        "_end_time",
+        "_event_type",
+        "_duration",
+        "_summary_header",
+        "_warned_ongoing",
+    )
+    # The integer code of the event type, set by each subclass
+    _event_type_code = EventType.UNKNOWN
+    # The colours used to print each event type, indexed by the integer code of the event type
+    _COLOURS = (
+        "\033[0m",  # Unknown: Default
+        "\033[31m",  # Discharging: Red
+        "\033[30m",  # Offline: Black
+        "\033[32m",  # Not Discharging: Green
+    )
+
     def __init__(
         self,
         monitor: Monitor,
@@ -470,8 +752,13 @@ class Event(ABC):
         self._ongoing = ongoing
         self._end_time = end_time
         self._event_type = event_type
-        self._duration = self.duration
         self._validate()
+        # The duration of a completed event is computed when first accessed and then stored (see `duration_at`)
+        self._duration: Optional[float] = None
+        # The unchanging part of the summary printed by `print`, formatted when first needed
+        self._summary_header: Optional[str] = None
+        # Whether the advisory that an ongoing event has no end time has been given (see `end_time`)
+        self._warned_ongoing: bool = False
 
     def _validate(self):
         """Validate the attributes of the event.
@@ -485,17 +772,35 @@ class Event(ABC):
         if self._end_time is not None and self._end_time < self._start_time:
             raise ValueError("End time must be after the start time.")
 
+    def _fixed_duration(self) -> float:
+        """Return the duration in minutes of a completed event, or nan if the event is ongoing or has no start time."""
+        if self._start_time is None or self._ongoing:
+            # If the start time is None, return nan (i.e., the event has no sensible duration)
+            return np.nan
+        return (self._end_time - self._start_time).total_seconds() / 60
+
     @property
     def duration(self) -> float:
         """Return the duration of the event in minutes."""
-        if self._start_time is not None:
-            if not self.ongoing:
-                return (self._end_time - self._start_time).total_seconds() / 60
-            else:
-                return (datetime.datetime.now() - self._start_time).total_seconds() / 60
-        else:
-            # If the start time is None, return nan (i.e., the event has no sensible duration)
-            return np.nan
+        if self._ongoing and self._start_time is not None:
+            return self.duration_at(self._monitor._water_company._now())
+        if self._duration is None:
+            self._duration = self._fixed_duration()
+        return self._duration
+
+    def duration_at(self, now: datetime.datetime) -> float:
+        """Return the duration of the event in minutes, measuring an ongoing event up to `now`.
+        Allows a single timestamp to be shared when computing the durations of many events.
+        """
+        if self._ongoing and self._start_time is not None:
+            return (now - self._start_time).total_seconds() / 60
+        return self.duration
+
+    def live_duration(self) -> float:
+        """Return the duration of the event in minutes, measuring an ongoing event up to the current time
+        on the clock (ignoring any time snapshot that is in use for a report).
+        """
+        return self.duration_at(datetime.datetime.now())
 
     @property
     def ongoing(self) -> bool:
@@ -516,8 +821,10 @@ class Event(ABC):
     @property
     def end_time(self) -> Union[datetime.datetime, None]:
         """Return the end time of the event."""
-        # If the event is Ongoing raise a Warning that the event is ongoing and has no end time but allow program to continue
-        if self._ongoing:
+        # If the event is Ongoing raise a Warning that the event is ongoing and has no end time but allow program to continue.
+        # The warning is only raised on the first access, as warnings.warn is slow and the advice does not change.
+        if self._ongoing and not self._warned_ongoing:
+            self._warned_ongoing = True
             warnings.warn(
                 "\033[91m"
                 + f"!ADVISORY! This {self.event_type} event for '{self.monitor.site_name}' (in {self.monitor.water_company.name}) is ongoing. `end_time` attribute returns None."
@@ -555,22 +862,15 @@ class Event(ABC):
         else:
             self._ongoing = value
             self._end_time = datetime.datetime.now()
-            self._duration = self.duration
+            # The event is now complete, so its duration is fixed
+            self._duration = self._fixed_duration()
 
     def print(self) -> None:
         """Print a summary of the event."""
-
-        # Define a dictionary of colours for the event types
-        event_type_colour = {
-            "Discharging": "\033[31m",  # Red
-            "Offline": "\033[30m",  # Black
-            "Not Discharging": "\033[32m",  # Green
-            "Unknown": "\033[0m",  # Default
-        }
-
-        print(
-            f"""
-        {event_type_colour[self.event_type]}
+        # The fields up to the start time do not change, so they are only formatted once
+        if self._summary_header is None:
+            self._summary_header = f"""
+        {self._COLOURS[self._event_type_code]}
         --------------------------------------
         Event Type: {self.event_type}
         Site Name: {self.monitor.site_name}
@@ -578,54 +878,61 @@ class Event(ABC):
         OSGB Coordinates: ({self.monitor.x_coord}, {self.monitor.y_coord})
         Receiving Watercourse: {self.monitor.receiving_watercourse}
         Start Time: {self.start_time}
-        End Time: {self.end_time if not self.ongoing else "Ongoing"}
+"""
+        print(
+            self._summary_header
+            + f"""        End Time: {self.end_time if not self.ongoing else "Ongoing"}
         Duration: {round(self.duration,2)} minutes\033[0m
         """
         )
 
-    def _to_row(self) -> pd.DataFrame:
-        """
-        Convert a discharge event to a row in a dataframe.
-        """
-        row = pd.DataFrame(
-            {
-                "LocationName": self.monitor.site_name,
-                "PermitNumber": self.monitor.permit_number,
-                "X": self.monitor.x_coord,
-                "Y": self.monitor.y_coord,
-                "ReceivingWaterCourse": self.monitor.receiving_watercourse,
-                "StartDateTime": self.start_time,
-                "StopDateTime": self.end_time,
-                "Duration": self.duration,
-                "OngoingEvent": self.ongoing,
-            },
-            index=[0],
-        )
-        return row
-
 
 class Discharge(Event):
     """A class to represent a discharge event at a CSO."""
 
-    def __init__(self, *args, **kwargs) -> None:
-        super().__init__(*args, **kwargs)
-        self._event_type = "Discharging"
+    __slots__ = ()
+    _event_type_code = EventType.DISCHARGING
+
+    def __init__(
+        self,
+        monitor: Monitor,
+        ongoing: bool,
+        start_time: datetime.datetime,
+        end_time: Optional[datetime.datetime] = None,
+    ) -> None:
+        super().__init__(monitor, ongoing, start_time, end_time, "Discharging")
 
 
 class Offline(Event):
     """A class to represent a CSO monitor being offline."""
 
-    def __init__(self, *args, **kwargs) -> None:
-        super().__init__(*args, **kwargs)
-        self._event_type = "Offline"
+    __slots__ = ()
+    _event_type_code = EventType.OFFLINE
+
+    def __init__(
+        self,
+        monitor: Monitor,
+        ongoing: bool,
+        start_time: datetime.datetime,
+        end_time: Optional[datetime.datetime] = None,
+    ) -> None:
+        super().__init__(monitor, ongoing, start_time, end_time, "Offline")
 
 
 class NoDischarge(Event):
     """A class to represent a CSO not discharging."""
 
-    def __init__(self, *args, **kwargs) -> None:
-        super().__init__(*args, **kwargs)
-        self._event_type = "Not Discharging"
+    __slots__ = ()
+    _event_type_code = EventType.NOT_DISCHARGING
+
+    def __init__(
+        self,
+        monitor: Monitor,
+        ongoing: bool,
+        start_time: datetime.datetime,
+        end_time: Optional[datetime.datetime] = None,
+    ) -> None:
+        super().__init__(monitor, ongoing, start_time, end_time, "Not Discharging")
 
 
 class WaterCompany(ABC):
@@ -641,7 +948,7 @@ class WaterCompany(ABC):
         alerts_table: The filename of the table that contains (manually generated) alerts.
         build_all_histories_locally: A method to build the history of all active monitors using the manually created alerts table.
         active_monitors: A dictionary of active monitors accessed by site name.
-        active_monitor_names: A list of the names of active monitors.
+        active_monitor_names: A tuple of the names of active monitors.
         accumulator: The D8 flow accumulator for the region of the water company.
         discharging_monitors: A list of all monitors that are currently recording a discharge event.
         recently_discharging_monitors: A list of all monitors that have discharged in the last 48 hours.
@@ -651,8 +958,10 @@ class WaterCompany(ABC):
         history_to_discharge_df: Convert a water company's total discharge history to a dataframe
         get_downstream_geojson: Get a geojson of the downstream points for all current discharges in BNG coordinates.
         get_downstream_info_geojson: Get a GeoJSON feature collection of more detailed information at the downstream points for current discharges.
+        save_downstream_info_geojson: Save the GeoJSON feature collection of `get_downstream_info_geojson` to a file, writing one feature at a time.
         get_historical_downstream_info_geojson: Get a GeoJSON feature collection of more detailed information at the downstream points for discharges *AT A GIVEN HISTORICAL TIME*.
         plot_current_status: Plot the current status of the Water Company network showing the downstream impact & monitor statuses.
+        get_monitors_near: Get the active monitors within a given distance of a point in BNG coordinates.
         get_historical_downstream_impact_at: Calculates the downstream extent of all monitors that were discharging (or, optionally, recently discharging) at a given time *AT A GIVEN HISTORICAL TIME*.
     """
 
@@ -667,8 +976,15 @@ class WaterCompany(ABC):
         self._clientID = clientID
         self._clientSecret = clientSecret
         self._timestamp: datetime.datetime = datetime.datetime.now()
+        # The time fixed by `_now_snapshot` while a report is being made, otherwise None
+        self._snapshot_time: datetime.datetime = None
+        # Row of each active monitor in the monitor arrays (set in `_set_monitor_arrays`)
+        self._monitor_rows: Dict[str, int] = {}
         self._active_monitors: Dict[str, Monitor] = self._fetch_active_monitors()
+        self._set_monitor_arrays()
         self._accumulator: D8Accumulator = None
+        # Drainage area of each node of the D8 grid, calculated when first needed (see `_get_drainage_area`)
+        self._drainage_area: np.ndarray = None
         self._d8_file_path: str = None
         self._history_timestamp: datetime.datetime = (
             None  # Will be set if all monitor histories are set
@@ -722,35 +1038,36 @@ class WaterCompany(ABC):
         Creates and handles the response from the API. If the response is valid, return a dataframe of the response.
         Otherwise, raise an exception. This is a helper function for the `_fetch_current_status_df` and `_fetch_monitor_history_df` functions.
         Loops through the API calls until all the records are fetched. If verbose is set to True, the function will print the full dataframe
-        to the console.
-        """
-        df = pd.DataFrame()
-        while True:
-            response = requests.get(url, params=params)
-            print("\033[36m" + "\tRequesting from " + response.url + "\033[0m")
-
-            # Check if the request was successful
-            if response.status_code == 200:
-                data = response.json()
-                # If no features are returned, break the loop
-                if "features" not in data or not data["features"]:
-                    print("\033[36m" + "\tNo more records to fetch" + "\033[0m")
-                    break
-                else:
-                    # Extract attributes from the JSON response
-                    attributes = [feature["attributes"] for feature in data["features"]]
-                    # Convert the attributes to a DataFrame
-                    df_temp = pd.DataFrame(attributes)
-                    df = pd.concat([df, df_temp], ignore_index=True)
-            else:
-                raise Exception(
-                    "\tRequest failed with status code {0}, and error message: {1}".format(
-                        response.status_code, response.json()
-                    )
+        to the console. The number of records is requested first, so that the pages known to exist are requested concurrently.
+        """
+        # Records from every page are collected and made into a dataframe once, rather than concatenating a dataframe
+        # for each page (which copies the records fetched so far every time)
+        records = []
+        page_size = params["resultRecordCount"]
+        count = self._fetch_api_record_count(url, params)
+        if count is not None and count > page_size:
+            offsets = range(params["resultOffset"], count, page_size)
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                pages = executor.map(
+                    lambda offset: self._fetch_api_page(url, {**params, "resultOffset": offset}),
+                    offsets,
                 )
+                for page in pages:
+                    records.extend(page)
+            params["resultOffset"] = offsets[-1] + page_size
+        # Continue page by page until no records are returned. This fetches everything if the count is not available,
+        # and any records added since it was requested otherwise.
+        while True:
+            page = self._fetch_api_page(url, params)
+            # If no features are returned, break the loop
+            if not page:
+                print("\033[36m" + "\tNo more records to fetch" + "\033[0m")
+                break
+            records.extend(page)
 
             # Increment offset for the next request
             params["resultOffset"] += params["resultRecordCount"]
+        df = pd.DataFrame(records)
 
         # Print the full dataframe to the console if verbose is set to True
         if verbose:
@@ -762,13 +1079,54 @@ class WaterCompany(ABC):
 
         return df
 
+    def _fetch_api_record_count(self, url: str, params: dict) -> Optional[int]:
+        """
+        Requests the number of records that a query of the API would return. Returns None if the API does not give it.
+        """
+        count_params = {
+            key: value
+            for key, value in params.items()
+            if key not in ("resultOffset", "resultRecordCount")
+        }
+        count_params["returnCountOnly"] = "true"
+        response = _http_session().get(url, params=count_params)
+        if response.status_code != 200:
+            return None
+        try:
+            count = response.json().get("count")
+        except ValueError:
+            return None
+        return count if isinstance(count, int) else None
+
+    def _fetch_api_page(self, url: str, params: dict) -> List[dict]:
+        """
+        Requests one page of records from the API, returning the attributes of each record (an empty list if there are
+        none). Raises an exception if the request fails.
+        """
+        response = _http_session().get(url, params=params)
+        print("\033[36m" + "\tRequesting from " + response.url + "\033[0m")
+
+        # Check if the request was successful
+        if response.status_code == 200:
+            data = response.json()
+            if "features" not in data or not data["features"]:
+                return []
+            # Extract attributes from the JSON response
+            return [feature["attributes"] for feature in data["features"]]
+        raise Exception(
+            "\tRequest failed with status code {0}, and error message: {1}".format(
+                response.status_code, response.json()
+            )
+        )
+
     def _fetch_active_monitors(self) -> Dict[str, Monitor]:
         """
         Returns a dictionary of Monitor objects representing the active monitors.
         """
         df = self._fetch_current_status_df()
         monitors = {}
-        for _, row in df.iterrows():
+        # Plain dicts are much cheaper to build than the Series that `iterrows` makes for every row
+        for row in df.to_dict("records"):
             monitor = self._row_to_monitor(row=row)
             event = self._row_to_event(row=row, monitor=monitor)
             monitor.current_event = event
@@ -822,7 +1180,14 @@ class WaterCompany(ABC):
 
         # Set the history timestamp to the current time
         self._history_timestamp = datetime.datetime.now()
-        df = pd.read_csv(self.alerts_table)
+        df = pd.read_csv(
+            self.alerts_table,
+            dtype={
+                "AlertType": _ALERT_TYPE_DTYPE,
+                "PermitNumber": "category",
+                "ReceivingWaterCourse": "category",
+            },
+        )
         historical_names = df["LocationName"].unique().tolist()
         # Find which monitors present in historical_names are not in active_names
         active_names = self.active_monitor_names
@@ -836,7 +1201,7 @@ class WaterCompany(ABC):
         for name in active_names:
             subset = df[df["LocationName"] == name]
             monitor = self.active_monitors[name]
-            monitor._history = self._alerts_df_to_events_list(subset, monitor)
+            monitor.history = self._alerts_df_to_events_list(subset, monitor)
 
     def _fetch_d8_file(self, url: str, known_hash: str) -> str:
         """
@@ -844,7 +1209,7 @@ class WaterCompany(ABC):
         This is all handled by the pooch package. The hash of the file is checked against the known hash to ensure the file is not corrupted.
         If the file is already present in the pooch cache, it will not be downloaded again.
         """
-        file_path = pooch.retrieve(url=url, known_hash=known_hash)
+        file_path = _retrieve_d8_file(url, known_hash)
 
         return file_path
 
@@ -888,33 +1253,35 @@ class WaterCompany(ABC):
         return self._active_monitors
 
     @property
-    def active_monitor_names(self) -> List[str]:
+    def active_monitor_names(self) -> Tuple[str, ...]:
         """Return the names of active monitors."""
-        return list(self._active_monitors.keys())
+        return self._active_monitor_names
 
     @property
     def discharging_monitors(self) -> List[Monitor]:
         """Return a list of all monitors that are currently recording a discharge event."""
-        return [
-            monitor
-            for monitor in self._active_monitors.values()
-            if monitor.current_status == "Discharging"
-        ]
+        if self._discharging_monitors is None:
+            self._discharging_monitors = self._monitor_array[
+                self._status_codes == EventType.DISCHARGING
+            ].tolist()
+        return list(self._discharging_monitors)
 
     @property
     def recently_discharging_monitors(self) -> List[Monitor]:
         """Return a list of all monitors that have discharged in the last 48 hours."""
-        return [
-            monitor
-            for monitor in self._active_monitors.values()
-            if monitor.discharge_in_last_48h
-        ]
+        if self._recently_discharging_monitors is None:
+            self._recently_discharging_monitors = self._monitor_array[
+                self._recent_discharge
+            ].tolist()
+        return list(self._recently_discharging_monitors)
 
     @property
     def accumulator(self) -> D8Accumulator:
         """Return the D8 flow accumulator for the area of the water company."""
         if self._accumulator is None:
-            self._accumulator = D8Accumulator(self._d8_file_path)
+            # The loaded flow network is shared by every company using the same D8 file. Each company gets its own
+            # (shallow) copy, so that e.g. setting `arr` on it does not affect the others.
+            self._accumulator = copy.copy(_load_accumulator(self._d8_file_path))
         return self._accumulator
 
     def update(self):
@@ -922,8 +1289,111 @@ class WaterCompany(ABC):
         Update the active_monitors list and the timestamp.
         """
         self._active_monitors = self._fetch_active_monitors()
+        self._set_monitor_arrays()
         self._timestamp = datetime.datetime.now()
 
+    @contextlib.contextmanager
+    def _now_snapshot(self):
+        """
+        Context manager that fixes the current time for the duration of the block, so that all ongoing events
+        in a report are measured up to the same instant. Yields the snapshot time. If a snapshot is already active
+        (e.g., in a nested call) it is reused. The snapshot only applies to this water company and its monitors.
+        """
+        if self._snapshot_time is not None:
+            yield self._snapshot_time
+            return
+        self._snapshot_time = datetime.datetime.now()
+        try:
+            yield self._snapshot_time
+        finally:
+            self._snapshot_time = None
+
+    def _now(self) -> datetime.datetime:
+        """
+        Returns the current time, or the snapshot of it if one has been taken with `_now_snapshot`.
+        """
+        if self._snapshot_time is None:
+            return datetime.datetime.now()
+        return self._snapshot_time
+
+    def _set_monitor_arrays(self) -> None:
+        """
+        Store the attributes of the active monitors that are scanned in bulk as contiguous arrays (one entry per monitor,
+        in the same order as active_monitors): x and y coordinates, the type of the current event, and
+        whether each has discharged in the last 48 hours.
+        """
+        monitors = tuple(self._active_monitors.values())
+        n = len(monitors)
+        # The active monitors in row order, iterated by scans that do not need the names
+        self._monitors = monitors
+        # ...and as an object array, so that they can be selected with the boolean arrays below
+        self._monitor_array = np.empty(n, dtype=object)
+        self._monitor_array[:] = monitors
+        self._active_monitor_names = tuple(self._active_monitors.keys())
+        self._monitor_rows = {monitor.site_name: i for i, monitor in enumerate(monitors)}
+        # Coordinates are kept as float64: BNG northings reach ~1.2e6 m, where float32 can only resolve ~0.1 m,
+        # which is enough to move a monitor near a cell edge into a neighbouring cell
+        self._monitor_x = np.array(
+            [monitor.x_coord for monitor in monitors], dtype=np.float64
+        )
+        self._monitor_y = np.array(
+            [monitor.y_coord for monitor in monitors], dtype=np.float64
+        )
+        # Rows sorted by x coordinate (missing coordinates last), for spatial queries (see `get_monitors_near`)
+        self._x_order = np.argsort(self._monitor_x, kind="stable")
+        self._x_sorted = self._monitor_x[self._x_order]
+        self._status_codes = np.fromiter(
+            (monitor.current_event._event_type_code for monitor in monitors),
+            dtype=np.int8,
+            count=n,
+        )
+        self._recent_discharge = np.fromiter(
+            (bool(monitor._discharge_in_last_48h) for monitor in monitors),
+            dtype=bool,
+            count=n,
+        )
+        # The lists of discharging monitors are built from the arrays when first requested
+        self._discharging_monitors: List[Monitor] = None
+        self._recently_discharging_monitors: List[Monitor] = None
+        # The last downstream geojson and the source nodes it was calculated from (see `get_downstream_geojson`)
+        self._downstream_geojson_key: Tuple[int, ...] = None
+        self._downstream_geojson: MultiLineString = None
+        # The events of all the monitors' histories, sorted by start time (see `_get_history_index`)
+        self._history_index: tuple = None
+
+    def _monitor_status_changed(self, monitor: Monitor) -> None:
+        """
+        Called when the current event of a monitor is set, to keep the array of current event types
+        up to date. Ignores monitors that are not (yet) in the arrays of active monitors.
+        """
+        row = self._monitor_rows.get(monitor.site_name)
+        if row is None or self._active_monitors.get(monitor.site_name) is not monitor:
+            return
+        event = monitor.current_event
+        self._status_codes[row] = event._event_type_code
+        self._discharging_monitors = None
+
+    def get_monitors_near(self, x: float, y: float, radius: float) -> List[Monitor]:
+        """
+        Get the active monitors within a given distance of a point.
+
+        Args:
+            x: The easting of the point in BNG coordinates (m).
+            y: The northing of the point in BNG coordinates (m).
+            radius: The distance from the point (m).
+
+        Returns:
+            A list of the monitors within `radius` of the point, in the same order as active_monitors.
+        """
+        # Only monitors in the band of x coordinates within radius of the point need their distance checking
+        lo = np.searchsorted(self._x_sorted, x - radius, side="left")
+        hi = np.searchsorted(self._x_sorted, x + radius, side="right")
+        rows = self._x_order[lo:hi]
+        dx = self._monitor_x[rows] - x
+        dy = self._monitor_y[rows] - y
+        near = dx**2 + dy**2 <= radius**2
+        return [self._monitors[i] for i in np.sort(rows[near])]
+
     def _calculate_downstream_impact(
         self, source_monitors: List[Monitor]
     ) -> np.ndarray:
@@ -937,25 +1407,40 @@ class WaterCompany(ABC):
         Returns:
             2D numpy array of the domain area showing number of discharges upstream of a given point.
         """
-        # Extract all the xy coordinates of active discharges
-        accumulator = self.accumulator
-        # Coords of all sources in OSGB
+        source_nodes = self._source_nodes(source_monitors)
+        # Propagate the discharges downstream
+        return self.accumulator.accumulate_sources(source_nodes)
 
-        source_nodes = [] 
-        for discharge in source_monitors:
-            try:
-                source_nodes.append(
-                    accumulator.coord_to_node(discharge.x_coord, discharge.y_coord)
-                )
-            except ValueError as e:
-                warnings.warn(f"Skipping out of bounds monitor {discharge.site_name}: {e}")
+    def _source_nodes(self, source_monitors: List[Monitor]) -> np.ndarray:
+        """
+        Returns the nodes of the D8 grid at which the given monitors are located, skipping (with a warning)
+        any monitors that are outside the grid.
+        """
+        nodes, in_bounds = self._monitor_nodes(source_monitors)
+        return nodes[in_bounds]
 
-        # Set up the source array for propagating discharges downstream
-        source_array = np.zeros(accumulator.arr.shape).flatten()
-        source_array[source_nodes] = 1
-        source_array = source_array.reshape(accumulator.arr.shape)
-        # Propagate the discharges downstream and add the result to the WaterCompany object
-        return accumulator.accumulate(source_array)
+    def _monitor_nodes(
+        self,
+        source_monitors: List[Monitor],
+        x: Optional[np.ndarray] = None,
+        y: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the nodes of the D8 grid at which the given monitors are located, and a boolean array that is True
+        for monitors inside the grid. Warns for each monitor that is outside the grid. The coordinates of the
+        monitors can be passed if they are already to hand (e.g., from the monitor arrays).
+        """
+        if x is None or y is None:
+            # Coords of all sources in OSGB, gathered in one pass and converted to nodes together
+            n = len(source_monitors)
+            x = np.fromiter((monitor._x_coord for monitor in source_monitors), dtype=np.float64, count=n)
+            y = np.fromiter((monitor._y_coord for monitor in source_monitors), dtype=np.float64, count=n)
+        nodes, in_bounds = self.accumulator.coords_to_nodes(x, y)
+        for i in np.flatnonzero(~in_bounds):
+            warnings.warn(
+                f"Skipping out of bounds monitor {source_monitors[i].site_name}: Coordinate is out of bounds"
+            )
+        return nodes, in_bounds
 
     def get_historical_downstream_impact_at(
         self, time: datetime.datetime, include_recent_discharges: bool = False
@@ -989,14 +1474,27 @@ class WaterCompany(ABC):
         Returns:
             A geojson MultiLineString of the downstream points for all active (or optionally recent) discharges.
         """
-        # Calculate the downstream impact
+        # Select the sources straight from the monitor arrays
         if include_recent_discharges:
-            sources = self.recently_discharging_monitors
+            is_source = self._recent_discharge
         else:
-            sources = self.discharging_monitors
-        downstream_impact = self._calculate_downstream_impact(source_monitors=sources)
+            is_source = self._status_codes == EventType.DISCHARGING
+        nodes, in_bounds = self._monitor_nodes(
+            self._monitor_array[is_source],
+            self._monitor_x[is_source],
+            self._monitor_y[is_source],
+        )
+        source_nodes = nodes[in_bounds]
+        # The channel segments only depend on which nodes are sources, so reuse the last result if these are unchanged
+        key = tuple(np.unique(source_nodes))
+        if key == self._downstream_geojson_key:
+            return self._downstream_geojson
+        downstream_impact = self.accumulator.accumulate_sources(source_nodes)
         # Convert the downstream impact to a geojson
-        return self._accumulator.get_channel_segments(downstream_impact, threshold=0.9)
+        geojson = self.accumulator.get_channel_segments(downstream_impact, threshold=0.9)
+        self._downstream_geojson_key = key
+        self._downstream_geojson = geojson
+        return geojson
 
     def _calculate_downstream_info(self, sources: List[Monitor]) -> FeatureCollection:
         """
@@ -1009,58 +1507,62 @@ class WaterCompany(ABC):
         Returns:
             A GeoJSON FeatureCollection of the downstream points for all active discharges.
         """
-        # Calculate downstream impact
-        impact = self._calculate_downstream_impact(source_monitors=sources)
+        return FeatureCollection(list(self._downstream_info_features(sources)))
 
-        # Calculate the upstream area
-        trsfm = self.accumulator.ds.GetGeoTransform()
-        cell_area = (trsfm[1] * trsfm[5] * -1) / 1000000
-        areas = np.ones(self.accumulator.arr.shape) * cell_area
-        drainage_area = self.accumulator.accumulate(areas)
+    def _downstream_info_features(self, sources: List[Monitor]) -> Iterator[Feature]:
+        """
+        Calculate the downstream impact of a list of source monitors and yield a GeoJSON Feature for each downstream point
+        in turn. See `_calculate_downstream_info`.
+        """
+        # Calculate downstream impact
+        source_nodes, in_bounds = self._monitor_nodes(sources)
+        if not in_bounds.any():
+            # No sources (e.g., nothing is discharging), so there are no downstream points
+            return
+        impact = self.accumulator.accumulate_sources(source_nodes[in_bounds]).ravel()
+
+        # The downstream profile of each source. Together these are exactly the nodes with a non-zero impact,
+        # so the impacted nodes are found without scanning the whole grid.
+        sources_in_bounds = np.flatnonzero(in_bounds)
+        profiles = [self.accumulator.get_profile(source_nodes[i])[0] for i in sources_in_bounds]
+        dstream_nodes = (
+            np.unique(np.concatenate(profiles)) if profiles else np.array([], dtype=np.int64)
+        )
 
         # Calculate relative importance of each area
-        impact_per_area = impact / drainage_area
-        impact = impact.flatten()
-        impact_per_area = impact_per_area.flatten()
-        dstream_nodes = np.where(impact > 0)[0]
+        impact_per_area = impact[dstream_nodes] / self._get_drainage_area().ravel()[dstream_nodes]
 
         # Create a dictionary of properties for each downstream node
         dstream_info = {
             node: {
                 "number_upstream_CSOs": impact[node],
-                "number_CSOs_per_km2": impact_per_area[node],
+                "number_CSOs_per_km2": per_area,
                 "CSOs": [],
             }
-            for node in dstream_nodes
+            for node, per_area in zip(dstream_nodes, impact_per_area)
         }
 
         # Add the sources for each impacted node to the dictionary of properties
-        for monitor in sources:
-            try:
-                node = self.accumulator.coord_to_node(monitor.x_coord, monitor.y_coord)
-            except ValueError as e:
-                warnings.warn(f"Skipping out of bounds monitor {monitor.site_name}: {e}")
-                continue                
-            dstream, _ = self.accumulator.get_profile(node)
+        for i, dstream in zip(sources_in_bounds, profiles):
             for node in dstream:
-                dstream_info[node]["CSOs"].append(monitor.site_name)
-
-        # Create a list of coordinates and properties for each impacted node in the network
-        coordinates = []
-        properties = []
-        for node in dstream_nodes:
-            coord = self.accumulator.node_to_coord(node)
-            coordinates.append(coord)
-            properties.append(dstream_info[node])
-
-        # Create a list of GeoJSON features from the coordinates and properties
-        features = [
-            Feature(geometry=Point(coord), properties=prop)
-            for coord, prop in zip(coordinates, properties)
-        ]
-        # Create a GeoJSON feature collection from the list of features
-        feature_collection = FeatureCollection(features)
-        return feature_collection
+                dstream_info[node]["CSOs"].append(sources[i].site_name)
+
+        # Create a GeoJSON feature from the coordinates and properties of each impacted node in the network
+        xs, ys = self.accumulator.nodes_to_coords(dstream_nodes)
+        for node, x, y in zip(dstream_nodes, xs.tolist(), ys.tolist()):
+            yield Feature(geometry=Point((x, y)), properties=dstream_info[node])
+
+    def _get_drainage_area(self) -> np.ndarray:
+        """
+        Returns the upstream (drainage) area in km2 of each node of the D8 grid. This only depends on the grid,
+        so it is calculated once and then stored.
+        """
+        if self._drainage_area is None:
+            trsfm = self.accumulator.ds.GetGeoTransform()
+            cell_area = (trsfm[1] * trsfm[5] * -1) / 1000000
+            areas = np.ones(self.accumulator.arr.shape) * cell_area
+            self._drainage_area = self.accumulator.accumulate(areas)
+        return self._drainage_area
 
     def _get_sources_at(
         self, time: datetime.datetime, include_recent_discharges: bool
@@ -1079,20 +1581,77 @@ class WaterCompany(ABC):
             ValueError: If the target time is in the future.
         """
 
-        if time > datetime.datetime.now():
+        if time > self._now():
             raise ValueError("The target time cannot be in the future.")
         sources = []
-        if include_recent_discharges:
-            for monitor in self.active_monitors.values():
-                if monitor.recent_discharge_at(time):
-                    sources.append(monitor)
-        else:
-            for monitor in self.active_monitors.values():
-                event = monitor.event_at(time)
-                if event is not None and event.event_type == "Discharging":
-                    sources.append(monitor)
+        # Every monitor is checked against the same current time
+        with self._now_snapshot():
+            if include_recent_discharges:
+                for monitor in self._monitors:
+                    if monitor.recent_discharge_at(time):
+                        sources.append(monitor)
+            else:
+                starts, ends, positions, owners, is_discharge = self._get_history_index()
+                target = np.datetime64(time, "us")
+                # Only the events that started before the target time can contain it. Ongoing events run until now.
+                n_before = np.searchsorted(starts, target, side="left")
+                ends = ends[:n_before]
+                ends = np.where(np.isnat(ends), np.datetime64(self._now(), "us"), ends)
+                matches = np.sort(positions[:n_before][target < ends])
+                # As in Monitor.event_at, the first (most recent) event of each monitor containing the time counts
+                found, first = np.unique(owners[matches], return_index=True)
+                for i in found[is_discharge[matches[first]]]:
+                    sources.append(self._monitors[i])
+                # Monitors with no event at the time are checked individually, which warns as usual
+                missing = np.ones(len(self._monitors), dtype=bool)
+                missing[found] = False
+                for i in np.flatnonzero(missing):
+                    self._monitors[i].event_at(time)
         return sources
 
+    def _get_history_index(
+        self,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Get the events of all the monitors' histories, sorted by start time (missing start times last), so that the
+        events containing a time can be found with a binary search rather than a scan of every history. Built when
+        first needed, and rebuilt if the active monitors or any of their histories have since been set.
+
+        Returns:
+            The sorted start and end times of the events, the position of each in the concatenation of the histories
+            (in the order of the active monitors), and, by position, the row of the event's monitor and whether it
+            is a discharge.
+
+        Raises:
+            ValueError: If the history of any monitor is not yet set.
+        """
+        monitors = self._monitors
+        for monitor in monitors:
+            if monitor._history is None:
+                raise ValueError("History is not yet set!")
+        key = tuple(monitor._history_starts for monitor in monitors)
+        if self._history_index is not None:
+            cached_key, index = self._history_index
+            if len(cached_key) == len(key) and all(a is b for a, b in zip(cached_key, key)):
+                return index
+        counts = [len(starts) for starts in key]
+        starts = np.concatenate(key) if key else np.array([], dtype="datetime64[us]")
+        ends = (
+            np.concatenate([monitor._history_ends for monitor in monitors])
+            if monitors
+            else np.array([], dtype="datetime64[us]")
+        )
+        is_discharge = (
+            np.concatenate([monitor._history_is_discharge for monitor in monitors])
+            if monitors
+            else np.array([], dtype=bool)
+        )
+        owners = np.repeat(np.arange(len(monitors)), counts)
+        positions = np.argsort(starts, kind="stable")
+        index = (starts[positions], ends[positions], positions, owners, is_discharge)
+        self._history_index = (key, index)
+        return index
+
     def get_downstream_info_geojson(
         self, include_recent_discharges=False
     ) -> FeatureCollection:
@@ -1116,6 +1675,28 @@ class WaterCompany(ABC):
             sources = self.discharging_monitors
         return self._calculate_downstream_info(sources)
 
+    def save_downstream_info_geojson(
+        self, filename: str, include_recent_discharges=False
+    ) -> None:
+        """
+        Save a GeoJSON feature collection of the downstream points for all CURRENT active discharges to a file. The output is
+        the same as that of `get_downstream_info_geojson`, but each feature is written as it is created rather than first
+        building the whole feature collection in memory.
+
+        Args:
+            filename: The file to write the GeoJSON to.
+            include_recent_discharges: Whether to include discharges that have occurred in the last 48 hours. Defaults to False.
+        """
+        # Check that "include_recent_discharges" is a boolean
+        if not isinstance(include_recent_discharges, bool):
+            raise ValueError("include_recent_discharges must be a boolean")
+
+        if include_recent_discharges:
+            sources = self.recently_discharging_monitors
+        else:
+            sources = self.discharging_monitors
+        write_geojson_features(filename, self._downstream_info_features(sources))
+
     def get_historical_downstream_info_geojson_at(
         self, time: datetime.datetime, include_recent_discharges=False
     ) -> FeatureCollection:
@@ -1168,16 +1749,23 @@ class WaterCompany(ABC):
                 "The dataframe contains events for a different monitor than the one specified!"
             )
 
-        for index, row in df.iterrows():
-            n_rows = len(df)
+        # Read the columns once, rather than indexing the dataframe for every row. The times are parsed together, unless
+        # they do not share a format, in which case each is parsed separately (as they would be one at a time).
+        alert_types = df["AlertType"].to_numpy(dtype=object)
+        raw_times = df["DateTime"].to_numpy(dtype=object)
+        try:
+            times = pd.to_datetime(df["DateTime"]).tolist()
+        except (ValueError, TypeError):
+            times = [pd.to_datetime(time) for time in raw_times]
+        n_rows = len(df)
+
+        for index in range(n_rows):
+            alert_type = alert_types[index]
             next_index = index + 1
 
             if index == n_rows - 1:
                 # At the last entry in the df...
-                if not (
-                    (row["AlertType"] == "Start")
-                    or (row["AlertType"] == "Offline start")
-                ):
+                if not ((alert_type == "Start") or (alert_type == "Offline start")):
                     # ... and it's not a start event!
                     reason = "the last recorded event is not a Start event!"
                     _warn(reason)
@@ -1185,64 +1773,58 @@ class WaterCompany(ABC):
                 else:
                     break
 
-            if row["AlertType"] == "Stop":
+            next_type = alert_types[next_index]
+            if alert_type == "Stop":
                 # Found the end of an event...
-                if df.iloc[next_index]["AlertType"] != "Start":
+                if next_type != "Start":
                     # ... but it's not preceded by a start event!
-                    reason = f"a stop event was not preceded by Start event at {df.iloc[index]['DateTime']}"
+                    reason = f"a stop event was not preceded by Start event at {raw_times[index]}"
                     _warn(reason)
                     continue
                 else:
                     # ... its preceded by a start event, so we create a Discharge event!
-                    stop = pd.to_datetime(row["DateTime"])
-                    start = pd.to_datetime(df.iloc[next_index]["DateTime"])
                     event = Discharge(
-                        monitor=monitor, ongoing=False, start_time=start, end_time=stop
+                        monitor=monitor,
+                        ongoing=False,
+                        start_time=times[next_index],
+                        end_time=times[index],
                     )
                     history.append(event)
 
-            if row["AlertType"] == "Offline stop":
+            if alert_type == "Offline stop":
                 # Found the end of an offline event...
-                if df.iloc[next_index]["AlertType"] != "Offline start":
+                if next_type != "Offline start":
                     # ... but it's not preceded by an offline start event!
-                    reason = f"an offline Stop event was not preceded by Offline Start event at {df.iloc[index]['DateTime']}"
+                    reason = f"an offline Stop event was not preceded by Offline Start event at {raw_times[index]}"
                     _warn(reason)
                     continue
                 else:
                     # ... its preceded by an offline start event, so we create an Offline event!
-                    stop = pd.to_datetime(row["DateTime"])
-                    start = pd.to_datetime(df.iloc[index + 1]["DateTime"])
                     event = Offline(
-                        monitor=monitor, ongoing=False, start_time=start, end_time=stop
+                        monitor=monitor,
+                        ongoing=False,
+                        start_time=times[next_index],
+                        end_time=times[index],
                     )
                     history.append(event)
 
-            if row["AlertType"] == "Start" or row["AlertType"] == "Offline start":
+            if alert_type == "Start" or alert_type == "Offline start":
                 # Found the start of an event...
-                if index == n_rows - 1:
-                    # ... but it's the last entry in the df, so we can't create an event! Quit the loop.
-                    break
+                if next_type == "Start" or next_type == "Offline start":
+                    # ... and it's followed by another start event!
+                    reason = f"a Start or Offline Start event was preceded by a Start or Offline Start event at {raw_times[index]}"
+                    _warn(reason)
+                    continue
                 else:
-                    if (
-                        df.iloc[next_index]["AlertType"] == "Start"
-                        or df.iloc[next_index]["AlertType"] == "Offline start"
-                    ):
-                        # ... and it's followed by another start event!
-                        reason = f"a Start or Offline Start event was preceded by a Start or Offline Start event at {df.iloc[index]['DateTime']}"
-                        _warn(reason)
-                        continue
-                    else:
-                        # ... and it's not followed by another start event, so we create a NoDischarge event
-                        # to represent the period between the start of this event and the end of the previous event.
-                        stop = pd.to_datetime(row["DateTime"])
-                        start = pd.to_datetime(df.iloc[next_index]["DateTime"])
-                        event = NoDischarge(
-                            monitor=monitor,
-                            ongoing=False,
-                            start_time=start,
-                            end_time=stop,
-                        )
-                        history.append(event)
+                    # ... and it's not followed by another start event, so we create a NoDischarge event
+                    # to represent the period between the start of this event and the end of the previous event.
+                    event = NoDischarge(
+                        monitor=monitor,
+                        ongoing=False,
+                        start_time=times[next_index],
+                        end_time=times[index],
+                    )
+                    history.append(event)
         return history
 
     def get_monitor_timeseries(
@@ -1273,7 +1855,7 @@ class WaterCompany(ABC):
             )
 
         times = []
-        now = datetime.datetime.now()
+        now = self._now()
         time = since
         while time < now:
             times.append(time)
@@ -1283,12 +1865,14 @@ class WaterCompany(ABC):
         recent = np.zeros(len(times), dtype=int)
         online = np.zeros(len(times), dtype=int)
 
-        for monitor in self.active_monitors.values():
+        # The masks of each monitor are added into the running totals in place, so only one monitor's masks are held
+        # at a time and no integer copies of them are made
+        for monitor in self._monitors:
             print(f"Processing {monitor.site_name}")
             mon_online, mon_active, mon_recent = monitor._history_masks(times)
-            active += mon_active.astype(int)
-            recent += mon_recent.astype(int)
-            online += mon_online.astype(int)
+            np.add(active, mon_active, out=active)
+            np.add(recent, mon_recent, out=recent)
+            np.add(online, mon_online, out=online)
 
         return pd.DataFrame(
             {
@@ -1307,9 +1891,8 @@ class WaterCompany(ABC):
         plt.figure(figsize=(11, 8))
         acc = self.accumulator
         geojson = self.get_downstream_geojson(include_recent_discharges=True)
-        dx, dy = acc.ds.GetGeoTransform()[1], acc.ds.GetGeoTransform()[5]
-        cell_area = dx * dy * -1
-        upstream_area = acc.accumulate(weights=cell_area * np.ones(acc.arr.shape))
+        # Upstream area in m2, from the stored drainage area of the grid
+        upstream_area = self._get_drainage_area() * 1000000
 
         # Plot the rivers
         plt.imshow(upstream_area, norm=LogNorm(), extent=acc.extent, cmap="Blues")
@@ -1320,28 +1903,22 @@ class WaterCompany(ABC):
             y = [c[1] for c in line]
             plt.plot(x, y, color="brown", linewidth=2)
 
-        # Plot the status of the monitors
-        for monitor in self.active_monitors.values():
-            if monitor.current_status == "Discharging":
-                colour = "red"
-                size = 100
-            elif monitor.discharge_in_last_48h:
-                colour = "orange"
-                size = 50
-            elif monitor.current_status == "Not Discharging":
-                colour = "green"
-                size = 10
-            elif monitor.current_status == "Offline":
-                colour = "grey"
-                size = 25
-            plt.scatter(
-                monitor.x_coord,
-                monitor.y_coord,
-                color=colour,
-                s=size,
-                zorder=10,
-                marker="x",
-            )
+        # Plot the status of the monitors, in priority order: discharging, recently discharging, not discharging, offline
+        status = [
+            self._status_codes == EventType.DISCHARGING,
+            self._recent_discharge,
+            self._status_codes == EventType.NOT_DISCHARGING,
+        ]
+        colours = np.select(status, ["red", "orange", "green"], default="grey")
+        sizes = np.select(status, [100, 50, 10], default=25)
+        plt.scatter(
+            self._monitor_x,
+            self._monitor_y,
+            color=colours,
+            s=sizes,
+            zorder=10,
+            marker="x",
+        )
         # Set the axis to be equal
         plt.axis("equal")
         plt.tight_layout()
@@ -1366,17 +1943,9 @@ class WaterCompany(ABC):
                 "History may not yet be set. Try running set_all_histories() first."
             )
         print("\033[36m" + f"Building output data-table" + "\033[0m")
-        df = pd.DataFrame()
-        for monitor in self.active_monitors.values():
-            print("\033[36m" + f"\tProcessing {monitor.site_name}" + "\033[0m")
-            for event in monitor.history:
-                if event.event_type == "Discharging":
-                    df = pd.concat([df, event._to_row()], ignore_index=True)
-
-        df.sort_values(
-            by="StartDateTime", inplace=True, ignore_index=True, ascending=False
-        )
-        return df
+        # Every ongoing event in the table is measured up to the same time
+        with self._now_snapshot():
+            return self._history_to_df(EventType.DISCHARGING)
 
     def history_to_offline_df(self) -> pd.DataFrame:
         """
@@ -1394,12 +1963,74 @@ class WaterCompany(ABC):
                 "History may not yet be set. Try running set_all_histories() first."
             )
         print("\033[36m" + f"Building output data-table" + "\033[0m")
-        df = pd.DataFrame()
-        for monitor in self.active_monitors.values():
+        # Every ongoing event in the table is measured up to the same time
+        with self._now_snapshot():
+            return self._history_to_df(EventType.OFFLINE)
+
+    def _history_to_df(self, event_type: EventType) -> pd.DataFrame:
+        """
+        Builds a dataframe of the events of the given type in the histories of all active monitors, most recent first.
+        This is the shared implementation of history_to_discharge_df and history_to_offline_df.
+
+        Raises:
+            ValueError: If the history of any monitor is not yet set.
+        """
+        monitors = self._monitors
+        for monitor in monitors:
+            if monitor._history is None:
+                raise ValueError("History is not yet set!")
+        # The events of the given type in the history of each monitor
+        if event_type == EventType.DISCHARGING:
+            selections = [monitor._history_is_discharge for monitor in monitors]
+        else:
+            selections = [
+                np.fromiter(
+                    (event._event_type_code == event_type for event in monitor._history),
+                    dtype=bool,
+                    count=len(monitor._history),
+                )
+                for monitor in monitors
+            ]
+        # Preallocate typed columns and fill them with the cached history arrays of each monitor
+        n = sum(np.count_nonzero(selected) for selected in selections)
+        names = np.empty(n, dtype=object)
+        permits = np.empty(n, dtype=object)
+        xs = np.empty(n, dtype=np.float64)
+        ys = np.empty(n, dtype=np.float64)
+        watercourses = np.empty(n, dtype=object)
+        starts = np.empty(n, dtype="datetime64[us]")
+        stops = np.empty(n, dtype="datetime64[us]")
+        k = 0
+        for monitor, selected in zip(monitors, selections):
             print("\033[36m" + f"\tProcessing {monitor.site_name}" + "\033[0m")
-            for event in monitor.history:
-                if event.event_type == "Offline":
-                    df = pd.concat([df, event._to_row()], ignore_index=True)
+            m = np.count_nonzero(selected)
+            names[k : k + m] = monitor.site_name
+            permits[k : k + m] = monitor.permit_number
+            xs[k : k + m] = monitor.x_coord
+            ys[k : k + m] = monitor.y_coord
+            watercourses[k : k + m] = monitor.receiving_watercourse
+            starts[k : k + m] = monitor._history_starts[selected]
+            stops[k : k + m] = monitor._history_ends[selected]
+            k += m
+        # Ongoing events have no end time, and are all measured up to the same time
+        ongoing = np.isnat(stops)
+        ends = np.where(ongoing, np.datetime64(self._now(), "us"), stops)
+        # Events without a start time have a duration of nan
+        durations = (ends - starts) / np.timedelta64(1, "m")
+        df = pd.DataFrame(
+            {
+                "LocationName": names,
+                "PermitNumber": permits,
+                "X": xs,
+                "Y": ys,
+                "ReceivingWaterCourse": watercourses,
+                "StartDateTime": starts,
+                "StopDateTime": stops,
+                "Duration": durations,
+                "OngoingEvent": ongoing,
+            },
+            copy=False,
+        )
 
         df.sort_values(
             by="StartDateTime", inplace=True, ignore_index=True, ascending=False
@@ -1441,14 +2072,16 @@ class WaterCompany(ABC):
                 os.remove(self._alerts_table_update_list)
             print("Alerts table doesn't exist! \nCreating new alerts table...")
             alerts = pd.DataFrame()
-            for monitor in self.active_monitors.values():
+            for monitor in self._monitors:
                 row = _make_start_alert_row(monitor)
                 alerts = pd.concat([alerts, row])
 
         # We have a file, so we need to update it
         else:
             # Load in current table of alerts
-            alerts = pd.read_csv(alerts_filename)
+            alerts = pd.read_csv(
+                alerts_filename, dtype={"AlertType": _ALERT_TYPE_DTYPE}
+            )
 
             # Loop through all monitors operated by the water company
             for name, monitor in self.active_monitors.items():
@@ -1701,10 +2334,10 @@ class WaterCompany(ABC):
                                 f"For monitor {monitor.site_name}, event type has changed from {prev_alert} to {new_alert} but no corresponding action has been implemented."
                             )
 
-        # Sort output from oldest bottom to newest top
-        alerts.sort_values(by="DateTime", inplace=True, ascending=False)
-        # Reset index to ensure it is in order
-        alerts.reset_index(drop=True, inplace=True)
+        # Sort output from oldest bottom to newest top, resetting the index in the same pass
+        alerts = alerts.sort_values(
+            by="DateTime", ascending=False, ignore_index=True, kind="stable"
+        )
         # Overwrite the previous alerts table
         alerts.to_csv(
             alerts_filename,
@@ -1719,6 +2352,55 @@ class WaterCompany(ABC):
         )
 
 
+# Holds the HTTP session used by each thread (see `_http_session`)
+_http_local = threading.local()
+
+
+def _http_session() -> requests.Session:
+    """
+    Returns the HTTP session of the current thread, so that successive requests to an API reuse open connections
+    rather than making a new connection (and TLS handshake) for each page of results. Sessions are kept per thread,
+    as they are not guaranteed to be thread-safe and histories are fetched from several threads at once.
+    """
+    session = getattr(_http_local, "session", None)
+    if session is None:
+        session = _http_local.session = requests.Session()
+    return session
+
+
+@functools.lru_cache(maxsize=16)
+def _retrieve_d8_file(url: str, known_hash: str) -> str:
+    """
+    Retrieves a D8 file with pooch. Cached so that the (large) file is only hashed to check its integrity once per
+    process, rather than every time a WaterCompany object is created.
+    """
+    return pooch.retrieve(url=url, known_hash=known_hash)
+
+
+@functools.lru_cache(maxsize=4)
+def _load_accumulator(d8_file_path: str) -> D8Accumulator:
+    """
+    Loads the D8 flow accumulator from the given file. Cached so that the flow network for a region is only built once
+    per process, however many WaterCompany objects (e.g., after re-initialising) use it. As the instance is shared, its
+    arrays are made read-only, and WaterCompany.accumulator hands out copies of it rather than the instance itself.
+    """
+    accumulator = D8Accumulator.from_cache(d8_file_path)
+    accumulator._arr = _read_only(accumulator._arr)
+    accumulator._receivers = _read_only(accumulator._receivers)
+    accumulator._order = _read_only(accumulator._order)
+    accumulator._baselevel_nodes = _read_only(accumulator._baselevel_nodes)
+    return accumulator
+
+
+def _read_only(arr) -> np.ndarray:
+    """
+    Returns a read-only view of an array (or Cython memoryview), which shares its memory.
+    """
+    view = np.asarray(arr).view()
+    view.flags.writeable = False
+    return view
+
+
 def make_alert_row(
     monitor: Monitor, alert_type: str, datetime_obj: datetime.datetime, note: str = ""
 ) -> pd.DataFrame:
@@ -1735,19 +2417,19 @@ def make_alert_row(
     """
 
     # Check that the alert type is valid
-    if alert_type not in ["Start", "Stop", "Offline start", "Offline stop"]:
+    if alert_type not in _VALID_ALERT_TYPES:
         raise ValueError("Invalid alert type.")
     return pd.DataFrame(
         {
             "LocationName": monitor.site_name,
             "PermitNumber": monitor.permit_number,
-            "DateTime": datetime_obj.strftime("%Y-%m-%dT%H:%M:%S"),
-            "AlertType": alert_type,
+            "DateTime": datetime_obj.isoformat(timespec="seconds"),
+            "AlertType": pd.Categorical([alert_type], dtype=_ALERT_TYPE_DTYPE),
             "X": monitor.x_coord,
             "Y": monitor.y_coord,
             "ReceivingWaterCourse": monitor.receiving_watercourse,
-            "AlertCreated": monitor.water_company.timestamp.strftime(
-                "%Y-%m-%dT%H:%M:%S"
+            "AlertCreated": monitor.water_company.timestamp.isoformat(
+                timespec="seconds"
             ),
             "Note": note,
         },
@@ -1761,27 +2443,23 @@ def _make_start_alert_row(monitor: Monitor):
     """
     event = monitor.current_event
     # Determine the alert type based on the event type
-    if event.event_type == "Not Discharging":
-        alert_type = "Stop"
-    elif event.event_type == "Discharging":
-        alert_type = "Start"
-    elif event.event_type == "Offline":
-        alert_type = "Offline start"
-    else:
+    try:
+        alert_type = _EVENT_TO_ALERT[event.event_type]
+    except KeyError:
         raise ValueError("Event type not recognised.")
 
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore")
-        if event.start_time is None:
-            # If the event has no start time, we use the timestamp of the watercompany.
-            # Implicitly it says that the event has started at the time of checking but we cannot be sure exactly when.
-            datetime = monitor.water_company.timestamp
-            # Add a note to say that the event had no start time associated with it
-            note = "Event had no start time. Alert time set to time of last update."
-            return make_alert_row(monitor, alert_type, datetime, note)
-        else:
-            datetime = event.start_time
-            return make_alert_row(monitor, alert_type, datetime)
+    # Read the underlying attribute rather than `start_time` as the property warns when it is None,
+    # which is an expected case here.
+    start_time = event._start_time
+    if start_time is None:
+        # If the event has no start time, we use the timestamp of the watercompany.
+        # Implicitly it says that the event has started at the time of checking but we cannot be sure exactly when.
+        datetime = monitor.water_company.timestamp
+        # Add a note to say that the event had no start time associated with it
+        note = "Event had no start time. Alert time set to time of last update."
+        return make_alert_row(monitor, alert_type, datetime, note)
+    else:
+        return make_alert_row(monitor, alert_type, start_time)
 
 
 def _make_offline_stop_alert_row(monitor: Monitor, endtime: datetime.datetime):
@@ -1798,6 +2476,45 @@ def _make_stop_alert_row(monitor: Monitor, endtime: datetime.datetime):
     return make_alert_row(monitor, "Stop", endtime, note="Imputed")
 
 
+def _is_descending_history(ends: np.ndarray) -> bool:
+    """
+    Checks in one pass whether an array of event end times (from a history, most recent first) is strictly
+    descending, with at most one ongoing (NaT) event, which must come first. If so, reversing the array
+    gives the same order as a stable sort.
+    """
+    ongoing = np.isnat(ends)
+    if ongoing[1:].any():
+        return False
+    closed = ends[1:] if ongoing[:1].any() else ends
+    return bool(np.all(closed[:-1] > closed[1:]))
+
+
+def _intern(value):
+    """
+    Interns a string so that equal strings share one object. Other values (e.g., missing values) are returned unchanged.
+    """
+    return sys.intern(value) if type(value) is str else value
+
+
+def _to_datetime64(times: List[Optional[datetime.datetime]]) -> np.ndarray:
+    """
+    Converts a list of datetimes to a datetime64[us] array. Missing values (None or NaT) become NaT.
+    """
+    return np.array(
+        [np.datetime64("NaT") if pd.isna(time) else time for time in times],
+        dtype="datetime64[us]",
+    )
+
+
+def _interval_mask(starts: np.ndarray, stops: np.ndarray, n: int) -> np.ndarray:
+    """
+    Returns a boolean array of length n that is True within any of the half-open index ranges [start, stop).
+    """
+    keep = starts < stops
+    counts = np.bincount(starts[keep], minlength=n + 1) - np.bincount(stops[keep], minlength=n + 1)
+    return np.cumsum(counts[:n]) > 0
+
+
 def round_time_down_15(time: datetime.datetime) -> datetime.datetime:
     """
     Rounds a datetime down to the nearest 15 minutes.
@@ -0,0 +1,134 @@
+"""
+Offline tests of the D8Accumulator class on a small synthetic flow grid.
+"""
+
+import numpy as np
+import pytest
+from osgeo import gdal
+
+import cfuncs as cf
+from poopy.d8_accumulator import D8Accumulator
+
+# Upper left corner and cell size of the synthetic grid
+ULX, ULY, DX = 400000.0, 200000.0, 50.0
+
+
+def make_d8_file(path, nrows: int = 12, ncols: int = 15) -> np.ndarray:
+    """
+    Writes a GeoTIFF of D8 flow directions to `path` and returns the array. Every cell flows either right, down or
+    to the lower right, so the network has no cycles.
+    """
+    rng = np.random.default_rng(0)
+    arr = rng.choice([1, 2, 4], size=(nrows, ncols)).astype(np.int32)
+    ds = gdal.GetDriverByName("GTiff").Create(str(path), ncols, nrows, 1, gdal.GDT_Int32)
+    ds.SetGeoTransform((ULX, DX, 0.0, ULY, 0.0, -DX))
+    band = ds.GetRasterBand(1)
+    band.WriteArray(arr)
+    band.FlushCache()
+    ds = None
+    return arr
+
+
+def reference_accumulate(receivers: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Accumulates the weights by following each node downstream to its baselevel node."""
+    accum = np.zeros(len(receivers), dtype=np.float64)
+    for node, weight in enumerate(weights):
+        accum[node] += weight
+        while receivers[node] != node:
+            node = receivers[node]
+            accum[node] += weight
+    return accum
+
+
+@pytest.fixture
+def d8_file(tmp_path):
+    path = tmp_path / "d8.tif"
+    make_d8_file(path)
+    return str(path)
+
+
+def test_from_cache_matches_constructor(d8_file):
+    built = D8Accumulator(d8_file)
+    # The first call builds the cache, the second memory-maps it
+    for _ in range(2):
+        cached = D8Accumulator.from_cache(d8_file)
+        np.testing.assert_array_equal(cached.arr, built.arr)
+        np.testing.assert_array_equal(cached.receivers, built.receivers)
+        np.testing.assert_array_equal(cached.order, built.order)
+        np.testing.assert_array_equal(cached.baselevel_nodes, built.baselevel_nodes)
+        np.testing.assert_allclose(cached.accumulate(), built.accumulate())
+    assert isinstance(cached.arr, np.memmap)
+
+
+def test_accumulate_matches_loop(d8_file):
+    acc = D8Accumulator.from_cache(d8_file)
+    rng = np.random.default_rng(1)
+    weights = rng.random(acc.arr.shape)
+    expected = reference_accumulate(acc.receivers, weights.ravel())
+    np.testing.assert_allclose(acc.accumulate(weights).ravel(), expected)
+
+
+def test_accumulate_flow_inplace(d8_file):
+    acc = D8Accumulator.from_cache(d8_file)
+    rng = np.random.default_rng(2)
+    counts = rng.integers(0, 3, size=acc.arr.size).astype(np.intc)
+    expected = reference_accumulate(acc.receivers, counts)
+    # Integer counts and float weights are both accumulated in place
+    for weights in (counts.copy(), counts.astype(np.float64)):
+        cf.accumulate_flow_inplace(acc.receivers, acc.order, weights)
+        np.testing.assert_allclose(weights, expected)
+
+
+def test_accumulate_sources(d8_file):
+    acc = D8Accumulator.from_cache(d8_file)
+    sources = np.array([0, 7, 20, 21, 100])
+    weights = np.zeros(acc.arr.shape)
+    weights.flat[sources] = 1
+    np.testing.assert_array_equal(acc.accumulate_sources(sources), acc.accumulate(weights))
+    np.testing.assert_array_equal(acc.accumulate_sources(sources[:0]), np.zeros(acc.arr.shape))
+
+
+def test_nodes_to_coords_matches_scalar(d8_file):
+    acc = D8Accumulator.from_cache(d8_file)
+    nodes = np.arange(acc.arr.size)
+    xs, ys = acc.nodes_to_coords(nodes)
+    expected = np.array([acc.node_to_coord(node) for node in nodes])
+    np.testing.assert_allclose(xs, expected[:, 0])
+    np.testing.assert_allclose(ys, expected[:, 1])
+    for node in (-1, acc.arr.size):
+        with pytest.raises(ValueError):
+            acc.nodes_to_coords(np.array([0, node]))
+        with pytest.raises(ValueError):
+            acc.node_to_coord(node)
+
+
+def test_coords_to_nodes_matches_scalar(d8_file):
+    acc = D8Accumulator.from_cache(d8_file)
+    nrows, ncols = acc.arr.shape
+    rng = np.random.default_rng(3)
+    # Points spread over and around the grid, some of them out of bounds
+    x = ULX + rng.uniform(-2, ncols + 2, size=200) * DX
+    y = ULY - rng.uniform(-2, nrows + 2, size=200) * DX
+    x[:3] = np.nan
+    nodes, in_bounds = acc.coords_to_nodes(x, y)
+    for i in range(len(x)):
+        try:
+            expected = acc.coord_to_node(x[i], y[i])
+        except ValueError:
+            assert not in_bounds[i]
+        else:
+            assert in_bounds[i] and nodes[i] == expected
+    assert not in_bounds[:3].any()
+
+
+def test_from_cache_rebuilds_truncated_cache(d8_file):
+    built = D8Accumulator.from_cache(d8_file)
+    # A cache file cut short (e.g., by a crash while writing it) is rebuilt rather than failing to load
+    receivers_path = d8_file + ".receivers.npy"
+    with open(receivers_path, "r+b") as f:
+        f.truncate(40)
+    rebuilt = D8Accumulator.from_cache(d8_file)
+    np.testing.assert_array_equal(rebuilt.receivers, built.receivers)
+    cached = D8Accumulator.from_cache(d8_file)
+    assert isinstance(cached._receivers, np.memmap)
+    np.testing.assert_array_equal(cached.receivers, built.receivers)
@@ -0,0 +1,376 @@
+"""
+Offline tests of the Monitor class, using small synthetic histories rather than the water company APIs.
+"""
+
+import datetime
+import os
+import warnings
+
+import numpy as np
+
+import poopy.poopy
+from poopy.poopy import (
+    Discharge,
+    Monitor,
+    NoDischarge,
+    Offline,
+    WaterCompany,
+    _interval_mask,
+    _is_descending_history,
+    round_time_down_15,
+    round_time_up_15,
+)
+
+
+class FakeWaterCompany(WaterCompany):
+    """A water company with no API, whose monitors are added by the tests."""
+
+    def __init__(self):
+        self._name = "FakeWater"
+        super().__init__(clientID="", clientSecret="")
+        # The history returned for each monitor by `_fetch_monitor_history`, and the number of calls to it
+        self.histories = {}
+        self.n_fetches = 0
+
+    def _fetch_active_monitors(self):
+        return {}
+
+    def _fetch_monitor_history(self, monitor, verbose=False):
+        self.n_fetches += 1
+        return list(self.histories[monitor.site_name])
+
+    def set_all_histories(self):
+        for monitor in self._monitors:
+            monitor.get_history()
+
+
+def make_monitor(company: WaterCompany, name: str = "Test CSO") -> Monitor:
+    """Makes a monitor of the given company with no current event or history."""
+    return Monitor(
+        site_name=name,
+        permit_number="PERMIT1",
+        x_coord=500000.0,
+        y_coord=200000.0,
+        receiving_watercourse="River Test",
+        water_company=company,
+    )
+
+
+def make_history(monitor: Monitor, now: datetime.datetime, current_start=True):
+    """
+    Makes a history (most recent first) of alternating discharge, no discharge and offline events over about a week
+    before `now`. The current event is an ongoing discharge, with no start time if `current_start` is False.
+    """
+    hours = datetime.timedelta(hours=1)
+    current = Discharge(monitor, True, now - 3 * hours if current_start else None)
+    history = [current]
+    end = now - 3 * hours
+    kinds = [NoDischarge, Discharge, NoDischarge, Offline]
+    for i in range(24):
+        length = (3 + 2 * (i % 5)) * hours + datetime.timedelta(minutes=7 * i)
+        history.append(kinds[i % 4](monitor, False, end - length, end))
+        end -= length
+    return history
+
+
+def reference_masks(history, times):
+    """
+    The masks of `Monitor._history_masks`, computed by looping over the events one at a time (as the method
+    did before it was vectorised). Events without a start time are skipped.
+    """
+    online = np.zeros(len(times), dtype=bool)
+    active = np.zeros(len(times), dtype=bool)
+    recent = np.zeros(len(times), dtype=bool)
+
+    def index(time):
+        return times.index(time) if time <= times[-1] else len(times)
+
+    known = [event for event in history if event._start_time is not None]
+    first_event = round_time_down_15(known[-1]._start_time)
+    online[max(0, index(first_event)) if first_event >= times[0] else 0 :] = True
+    for event in known:
+        if event.event_type not in ("Discharging", "Offline"):
+            continue
+        start_round = round_time_down_15(event._start_time)
+        if start_round < times[0]:
+            break
+        first = index(start_round)
+        if event.ongoing:
+            last = last_recent = len(times)
+        else:
+            end_round = round_time_up_15(event._end_time)
+            last = index(end_round)
+            recent_end = end_round + datetime.timedelta(hours=48)
+            last_recent = len(times) if recent_end > times[-1] else index(recent_end)
+        if event.event_type == "Discharging":
+            active[first:last] = True
+            recent[first:last_recent] = True
+        else:
+            online[first:last] = False
+    return online, active, recent
+
+
+def make_times(since: datetime.datetime, now: datetime.datetime):
+    times = []
+    time = round_time_down_15(since)
+    while time < now:
+        times.append(time)
+        time += datetime.timedelta(minutes=15)
+    return times
+
+
+def test_history_masks_match_loop():
+    company = FakeWaterCompany()
+    monitor = make_monitor(company)
+    now = datetime.datetime(2024, 6, 1, 12, 3)
+    monitor.history = make_history(monitor, now)
+    times = make_times(now - datetime.timedelta(days=5), now)
+    for got, expected in zip(monitor._history_masks(times), reference_masks(monitor.history, times)):
+        np.testing.assert_array_equal(got, expected)
+
+
+def test_history_masks_current_event_without_start():
+    company = FakeWaterCompany()
+    monitor = make_monitor(company)
+    now = datetime.datetime(2024, 6, 1, 12, 3)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        monitor.history = make_history(monitor, now, current_start=False)
+    times = make_times(now - datetime.timedelta(days=5), now)
+    online, active, recent = monitor._history_masks(times)
+    # The earlier discharges are still found, rather than the start-less current event ending the search
+    assert active.any()
+    for got, expected in zip((online, active, recent), reference_masks(monitor.history, times)):
+        np.testing.assert_array_equal(got, expected)
+
+
+def test_history_cache_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(poopy.poopy.pooch, "os_cache", lambda name: str(tmp_path))
+    company = FakeWaterCompany()
+    monitor = make_monitor(company)
+    history = make_history(monitor, datetime.datetime.now())
+    monitor.current_event = history[0]
+    company.histories[monitor.site_name] = history
+
+    monitor.get_history(use_cache=True)
+    assert company.n_fetches == 1
+    fetched_starts, fetched_ends = monitor._history_starts, monitor._history_ends
+
+    monitor.get_history(use_cache=True)
+    assert company.n_fetches == 1
+    np.testing.assert_array_equal(monitor._history_starts, fetched_starts)
+    np.testing.assert_array_equal(monitor._history_ends, fetched_ends)
+    assert [event.event_type for event in monitor.history] == [event.event_type for event in history]
+    # The live current event is kept, rather than a copy of it
+    assert monitor.history[0] is monitor.current_event
+
+    # Once the current event has changed, the saved history is stale and is fetched again
+    monitor.current_event.ongoing = False
+    monitor.current_event = NoDischarge(monitor, True, datetime.datetime.now())
+    company.histories[monitor.site_name] = [monitor.current_event] + history
+    monitor.get_history(use_cache=True)
+    assert company.n_fetches == 2
+    assert monitor.history[0] is monitor.current_event
+
+
+def test_history_cache_prunes_earlier_days(tmp_path, monkeypatch):
+    monkeypatch.setattr(poopy.poopy.pooch, "os_cache", lambda name: str(tmp_path))
+    company = FakeWaterCompany()
+    monitor = make_monitor(company)
+    other = make_monitor(company, name="Other CSO")
+    history = make_history(monitor, datetime.datetime.now())
+    monitor.current_event = history[0]
+    company.histories[monitor.site_name] = history
+    path = monitor._history_cache_path()
+    # Copies of this monitor's history from earlier days, and another monitor's copy
+    stale = [path.replace(datetime.date.today().isoformat(), day) for day in ("2024-01-01", "2024-01-02")]
+    kept = other._history_cache_path()
+    for file in stale + [kept]:
+        open(file, "wb").close()
+
+    monitor.get_history(use_cache=True)
+    assert os.path.exists(path) and os.path.exists(kept)
+    assert not any(os.path.exists(file) for file in stale)
+
+
+def make_shuffled_history(monitor: Monitor, now: datetime.datetime):
+    """
+    Makes a history that is not in order, including overlapping discharges and a second ongoing discharge that started
+    before the others, so that none of the fast paths for ordered histories are taken.
+    """
+    history = make_history(monitor, now)
+    rng = np.random.default_rng(0)
+    history = [history[i] for i in rng.permutation(len(history))]
+    history.append(Discharge(monitor, False, now - datetime.timedelta(days=6), now - datetime.timedelta(days=2)))
+    history.append(Discharge(monitor, True, now - datetime.timedelta(days=4)))
+    return history
+
+
+def reference_total_discharge(history, since, now):
+    """Total discharge in minutes since `since`, computed by looping over the events (as before vectorising)."""
+    total = 0.0
+    for event in history:
+        if event.event_type != "Discharging" or event._start_time is None:
+            continue
+        end = now if event.ongoing else event._end_time
+        if end <= since:
+            continue
+        total += (end - max(event._start_time, since)).total_seconds() / 60
+    return total
+
+
+def reference_event_at(history, time, now):
+    """The first event in the history containing `time` (as `event_at` did before vectorising)."""
+    for event in history:
+        if event._start_time is None:
+            continue
+        end = now if event.ongoing else event._end_time
+        if event._start_time < time < end:
+            return event
+    return None
+
+
+def reference_recent_discharge_at(history, time, now):
+    """Whether there was a discharge in the 48 hours before `time` (as `recent_discharge_at` did before vectorising)."""
+    for i, event in enumerate(history):
+        if event._start_time is None:
+            continue
+        end = now if event.ongoing else event._end_time
+        if event._start_time < time < end:
+            if event.event_type == "Discharging":
+                return True
+            while i + 2 < len(history):
+                previous = history[i + 1]
+                previous_end = now if previous.ongoing else previous._end_time
+                if time - previous_end > datetime.timedelta(hours=48):
+                    return False
+                elif previous.event_type == "Discharging":
+                    return True
+                i += 1
+            return False
+    return False
+
+
+def sample_times(now: datetime.datetime, history):
+    """Times spread over the history, including the start and end times of its events."""
+    times = [now - datetime.timedelta(minutes=37 * i) for i in range(1, 400)]
+    for event in history:
+        if event._start_time is not None:
+            times.append(event._start_time)
+        if event._end_time is not None:
+            times.append(event._end_time)
+    return times
+
+
+def test_history_setter_arrays():
+    company = FakeWaterCompany()
+    monitor = make_monitor(company)
+    now = datetime.datetime(2024, 6, 1, 12, 3)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        history = make_history(monitor, now, current_start=False)
+    monitor.history = history
+    assert np.isnat(monitor._history_starts[0]) and np.isnat(monitor._history_ends[0])
+    np.testing.assert_array_equal(
+        monitor._history_starts[1:], np.array([event._start_time for event in history[1:]], dtype="datetime64[us]")
+    )
+    np.testing.assert_array_equal(
+        monitor._history_ends[1:], np.array([event._end_time for event in history[1:]], dtype="datetime64[us]")
+    )
+    np.testing.assert_array_equal(
+        monitor._history_is_discharge, [event.event_type == "Discharging" for event in history]
+    )
+    # Completed discharges are sorted by end time, with the ongoing one last
+    ends = monitor._discharge_ends
+    assert np.isnat(ends[-1]) and np.all(ends[:-2] < ends[1:-1])
+
+
+def test_total_discharge_matches_loop():
+    company = FakeWaterCompany()
+    monitor = make_monitor(company)
+    now = datetime.datetime.now()
+    for ordered, history in ((True, make_history(monitor, now)), (False, make_shuffled_history(monitor, now))):
+        monitor.history = history
+        # Ordered histories use the running total of durations, others a scan of the discharges
+        assert (monitor._discharge_cumsum is not None) == ordered
+        with company._now_snapshot() as snapshot:
+            for days in (0.1, 0.5, 1, 2.3, 4, 6, 9, 30):
+                since = now - datetime.timedelta(days=days)
+                expected = reference_total_discharge(history, since, snapshot)
+                assert np.isclose(monitor.total_discharge(since=since), expected)
+            expected = reference_total_discharge(history, datetime.datetime(2000, 1, 1), snapshot)
+            assert np.isclose(monitor.total_discharge(), expected)
+
+
+def test_event_at_matches_loop():
+    company = FakeWaterCompany()
+    monitor = make_monitor(company)
+    now = datetime.datetime.now()
+    for history in (make_history(monitor, now), make_shuffled_history(monitor, now)):
+        monitor.history = history
+        with company._now_snapshot() as snapshot, warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            for time in sample_times(now, history):
+                assert monitor.event_at(time) is reference_event_at(history, time, snapshot)
+
+
+def test_recent_discharge_at_matches_loop():
+    company = FakeWaterCompany()
+    monitor = make_monitor(company)
+    now = datetime.datetime.now()
+    for history in (make_history(monitor, now), make_shuffled_history(monitor, now)):
+        monitor.history = history
+        with company._now_snapshot() as snapshot, warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            for time in sample_times(now, history):
+                expected = reference_recent_discharge_at(history, time, snapshot)
+                assert monitor.recent_discharge_at(time) == expected
+
+
+def test_interval_mask_matches_loop():
+    rng = np.random.default_rng(1)
+    n = 50
+    starts = rng.integers(0, n + 1, size=20)
+    stops = rng.integers(0, n + 1, size=20)
+    expected = np.zeros(n, dtype=bool)
+    for start, stop in zip(starts, stops):
+        expected[start:stop] = True
+    np.testing.assert_array_equal(_interval_mask(starts, stops, n), expected)
+    np.testing.assert_array_equal(_interval_mask(starts[:0], stops[:0], n), np.zeros(n, dtype=bool))
+
+
+def test_is_descending_history():
+    times = np.array(["2024-01-03", "2024-01-02", "2024-01-01"], dtype="datetime64[us]")
+    nat = np.array(["NaT"], dtype="datetime64[us]")
+    assert _is_descending_history(times)
+    assert _is_descending_history(np.concatenate((nat, times)))
+    assert _is_descending_history(times[:0])
+    assert not _is_descending_history(times[::-1])
+    # Repeated end times are not strictly descending
+    assert not _is_descending_history(times[[0, 1, 1, 2]])
+    # Only the first (most recent) event can be ongoing
+    assert not _is_descending_history(np.concatenate((times[:1], nat, times[1:])))
+    assert not _is_descending_history(np.concatenate((nat, nat, times)))
+
+
+def test_get_monitors_near_matches_brute_force():
+    company = FakeWaterCompany()
+    rng = np.random.default_rng(4)
+    monitors = {}
+    for i in range(300):
+        monitor = make_monitor(company, name=f"CSO {i}")
+        monitor._x_coord = 500000.0 + rng.uniform(-5000, 5000)
+        monitor._y_coord = 200000.0 + rng.uniform(-5000, 5000)
+        monitor.current_event = NoDischarge(monitor, True, datetime.datetime(2024, 1, 1))
+        monitors[monitor.site_name] = monitor
+    # A monitor without coordinates is never near anything
+    monitors["CSO 0"]._x_coord = np.nan
+    company._active_monitors = monitors
+    company._set_monitor_arrays()
+    for x, y, radius in ((500000.0, 200000.0, 1000.0), (496000.0, 203000.0, 2500.0), (0.0, 0.0, 100.0)):
+        expected = [
+            monitor
+            for monitor in monitors.values()
+            if (monitor.x_coord - x) ** 2 + (monitor.y_coord - y) ** 2 <= radius**2
+        ]
+        assert company.get_monitors_near(x, y, radius) == expected